@@ -0,0 +1,158 @@
+""" I M P O R T:  ###################################################################################################"""
+
+
+import argparse
+import collections
+import concurrent.futures
+import core
+import glob
+import os
+import sys
+import time
+
+
+""" C O N S T A N T S:  #############################################################################################"""
+
+
+# Extension of the written model files.
+_MODEL_EXTENSION = '.nbcm'
+
+# Modules loaded by every job.
+_MODULES = ['data', 'train']
+
+
+""" F U N C T I O N S:  #############################################################################################"""
+
+
+def _read_manifest(file_name):
+    """Returns (input, output or None) pairs of the manifest.
+    A line of the manifest is an input file name, optionally followed by a tab and an output file name.
+    Empty lines and lines starting with # are skipped."""
+    jobs = []
+    with open(file_name) as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                names = line.split('\t')
+                jobs.append((names[0], names[1] if len(names) > 1 else None))
+    return jobs
+
+
+def _expand_patterns(patterns):
+    """Returns (input, None) pairs of files matching the glob patterns, in order without duplicates."""
+    jobs, seen = [], set()
+    for pattern in patterns:
+        for file_name in sorted(glob.glob(pattern)) or [pattern]:
+            if file_name not in seen:
+                seen.add(file_name)
+                jobs.append((file_name, None))
+    return jobs
+
+
+def _output_names(jobs, output_dir):
+    """Returns names of model files of (input, output or None) jobs.
+    A model is named by its input file, inputs with the same name keep their path relative to the common
+    directory of the inputs. Raises ValueError if two jobs write the same file."""
+    defaults = [file_name for file_name, output in jobs if output is None]
+    stems = collections.Counter(os.path.splitext(os.path.basename(file_name))[0] for file_name in defaults)
+    directories = [os.path.dirname(os.path.abspath(file_name)) for file_name in defaults]
+    root = os.path.commonpath(directories) if directories else ''
+    names = []
+    for file_name, output in jobs:
+        if output is None:
+            stem = os.path.splitext(os.path.basename(file_name))[0]
+            if stems[stem] > 1:
+                stem = os.path.splitext(os.path.relpath(os.path.abspath(file_name), root))[0]
+            output = os.path.join(output_dir, stem + _MODEL_EXTENSION)
+        names.append(output)
+    clashes = [name for name, count in collections.Counter(map(os.path.abspath, names)).items() if count > 1]
+    if clashes:
+        raise ValueError('Several jobs write the same model file: %s' % ', '.join(clashes))
+    return names
+
+
+def _train_job(file_name, output, delimiter, memory_budget, workers, cache):
+    """Trains a model on the file in a new core and saves it. Returns a dict with the job report.
+    The job is timed after the core and its modules are loaded."""
+    interface_core = core.InterfaceCore(_MODULES, headless=True)
+    interface_data = interface_core.get_interface_data()
+    interface_train = interface_core.get_interface_train()
+    interface_train.nbc_set_cache(cache)
+    interface_data.set_train_file_name(file_name)
+    start = time.perf_counter()
+    interface_train.nbc_start_train(delimiter, memory_budget, workers)
+    trained = time.perf_counter()
+    interface_data.save_model_nbc(output)
+    model = interface_data.get_model_nbc()
+    return {'input': file_name, 'output': output, 'rows': int(model.d_c.sum()), 'classes': len(model.labels),
+            'tokens': len(model.tokens), 'bytes': os.path.getsize(file_name),
+            'train_seconds': trained - start, 'seconds': time.perf_counter() - start}
+
+
+def _print_job(report):
+    """Prints the line of the job report."""
+    print('%-40s %10d rows %8.3f s %12.0f rows/s %8.1f MB/s -> %s' % (
+        report['input'], report['rows'], report['seconds'], report['rows'] / max(report['seconds'], 1e-9),
+        report['bytes'] / 2 ** 20 / max(report['seconds'], 1e-9), report['output']), flush=True)
+
+
+def run(jobs, output_dir, delimiter=',', processes=None, memory_budget=None, workers=1, cache=None):
+    """Trains models on (input, output or None) jobs in a pool of processes.
+    Prints a line per finished job and the summary. Returns the number of failed jobs.
+    Raises ValueError if two jobs write the same model file, see _output_names."""
+    outputs = _output_names(jobs, output_dir)
+    for output in outputs:
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    start = time.perf_counter()
+    rows, failed = 0, 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as executor:
+        futures = {executor.submit(_train_job, file_name, output, delimiter, memory_budget, workers, cache): file_name
+                   for (file_name, _), output in zip(jobs, outputs)}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                report = future.result()
+            except Exception as error:
+                failed += 1
+                print('%-40s failed: %s' % (futures[future], error), file=sys.stderr, flush=True)
+            else:
+                rows += report['rows']
+                _print_job(report)
+    seconds = time.perf_counter() - start
+    print('%d jobs, %d failed, %d rows in %.3f s, %.0f rows/s' % (
+        len(jobs), failed, rows, seconds, rows / max(seconds, 1e-9)))
+    return failed
+
+
+def main(argv=None):
+    """Parses command line arguments and runs the jobs."""
+    parser = argparse.ArgumentParser(description='Trains NBC models on many files without the graphical interface.')
+    parser.add_argument('patterns', nargs='*', help='training files or glob patterns')
+    parser.add_argument('-m', '--manifest', help='file with an input name per line, optionally tab and output name')
+    parser.add_argument('-o', '--output-dir', default='.', help='directory of model files (default: current)')
+    parser.add_argument('-d', '--delimiter', default=',', help='delimiter of the training files (default: ,)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='number of parallel jobs (default: CPUs)')
+    parser.add_argument('-b', '--memory-budget', type=int, default=None, help='memory budget of a job in bytes')
+    parser.add_argument('-w', '--workers', type=int, default=1, help='processes counting shards of one file')
+    parser.add_argument('-c', '--cache', default=None, help='directory of the cache of trained models')
+    args = parser.parse_args(argv)
+
+    jobs = _expand_patterns(args.patterns)
+    if args.manifest is not None:
+        jobs += _read_manifest(args.manifest)
+    if not jobs:
+        parser.error('no training files')
+    try:
+        failed = run(jobs, args.output_dir, args.delimiter, args.jobs, args.memory_budget, args.workers, args.cache)
+    except ValueError as error:
+        parser.error(str(error))
+    return 1 if failed else 0
+
+
+""" E N T R Y   P O I N T:  #########################################################################################"""
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+
+""" E N D   O F   F I L E.  #########################################################################################"""
@@ -0,0 +1,263 @@
+""" I M P O R T:  ###################################################################################################"""
+
+
+import argparse
+import core
+import json
+import numpy
+import os
+import pandas
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+""" C O N S T A N T S:  #############################################################################################"""
+
+
+# Parameters of synthetic datasets: rows, columns of tokens, classes, vocabulary size and Zipf exponent.
+PRESETS = {
+    'small': {'rows': 20000, 'columns': 10, 'classes': 4, 'vocabulary': 1000, 'zipf': 1.1},
+    'medium': {'rows': 200000, 'columns': 20, 'classes': 8, 'vocabulary': 20000, 'zipf': 1.1},
+    'large': {'rows': 1000000, 'columns': 20, 'classes': 16, 'vocabulary': 100000, 'zipf': 1.1},
+    'wide': {'rows': 50000, 'columns': 200, 'classes': 4, 'vocabulary': 5000, 'zipf': 0.8},
+}
+
+# Phases reported by the train module and names of their timings.
+_TRAIN_PHASES = {'reading': 'train.read_csv', 'counting': 'train.count', 'building': 'train.build'}
+
+# Shortest time of a phase, which is compared with the baseline.
+_MIN_SECONDS = 1e-3
+
+
+""" F U N C T I O N S:  #############################################################################################"""
+
+
+def generate(file_name, rows, columns, classes, vocabulary, zipf, seed=0, delimiter=','):
+    """Writes a labeled table of tokens. Tokens follow the Zipf law with the exponent zipf,
+    shifted by the class, so that the classes can be told apart."""
+    rng = numpy.random.default_rng(seed)
+    ranks = numpy.arange(1, vocabulary + 1, dtype=numpy.float64)
+    probabilities = ranks ** -zipf
+    probabilities /= probabilities.sum()
+    labels = rng.integers(0, classes, rows)
+    shift = max(vocabulary // max(classes, 1), 1)
+    tokens = rng.choice(vocabulary, (rows, columns), p=probabilities) + (labels * shift)[:, numpy.newaxis]
+    frame = pandas.DataFrame(numpy.char.add('t', (tokens % vocabulary).astype(str)))
+    frame.insert(0, 'label', numpy.char.add('c', labels.astype(str)))
+    frame.to_csv(file_name, sep=delimiter, header=False, index=False)
+
+
+def _time(function, *args):
+    """Returns the seconds spent by the call."""
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+
+def _train(interface_core, delimiter, memory_budget, workers):
+    """Trains a model and returns seconds of the train phases."""
+    marks = []
+    interface_train = interface_core.get_interface_train()
+    interface_train.nbc_set_cache(None)
+
+    def progress(phase, rows):
+        if not marks or marks[-1][0] != phase:
+            marks.append((phase, time.perf_counter()))
+
+    interface_train.nbc_start_train(delimiter, memory_budget, workers, progress)
+    marks.append(('end', time.perf_counter()))
+    phases = {}
+    for (phase, start), (_, end) in zip(marks, marks[1:]):
+        name = _TRAIN_PHASES.get(phase, 'train.' + phase)
+        phases[name] = phases.get(name, 0.0) + end - start
+    return phases
+
+
+def _run_once(interface_core, file_name, delimiter, memory_budget, workers, directory):
+    """Runs every phase once and returns their seconds."""
+    interface_data = interface_core.get_interface_data()
+    interface_predict = interface_core.get_interface_by_name('predict')
+    model_name = os.path.join(directory, 'model.nbcm')
+    interface_data.set_train_file_name(file_name)
+    phases = _train(interface_core, delimiter, memory_budget, workers)
+    phases['data.to_dict'] = _time(interface_data.get_ready_model_nbc)
+    phases['data.save'] = _time(interface_data.save_model_nbc, model_name)
+    phases['data.load'] = _time(interface_data.load_model_nbc, model_name)
+    phases['predict.prepare'] = _time(interface_predict.nbc_prepare)
+    phases['predict.evaluate'] = _time(interface_predict.nbc_evaluate, file_name, delimiter)
+    return phases
+
+
+def _peak_bytes(function, *args):
+    """Returns the peak of memory allocated by the call, as traced by tracemalloc."""
+    tracemalloc.start()
+    try:
+        function(*args)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_case(name, parameters, repeat=3, memory_budget=None, workers=1, seed=0, delimiter=','):
+    """Generates the dataset and returns the result of the case: parameters,
+    the shortest seconds of every phase over repeat runs and peaks of memory of training and scoring."""
+    interface_core = core.InterfaceCore(core.MODULES_HEADLESS, headless=True)
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, name + '.csv')
+        generate(file_name, seed=seed, delimiter=delimiter, **parameters)
+        phases = {}
+        for _ in range(repeat):
+            for phase, seconds in _run_once(interface_core, file_name, delimiter, memory_budget, workers,
+                                            directory).items():
+                phases[phase] = min(phases.get(phase, seconds), seconds)
+        peaks = {'train': _peak_bytes(_train, interface_core, delimiter, memory_budget, workers),
+                 'predict': _peak_bytes(interface_core.get_interface_by_name('predict').nbc_evaluate, file_name,
+                                        delimiter)}
+        rows_per_second = parameters['rows'] / sum(seconds for phase, seconds in phases.items()
+                                                   if phase.startswith('train.'))
+        return {'parameters': dict(parameters, seed=seed, memory_budget=memory_budget, workers=workers),
+                'file_bytes': os.path.getsize(file_name), 'seconds': phases, 'peak_bytes': peaks,
+                'train_rows_per_second': rows_per_second}
+
+
+def hashing_report(parameters, buckets_list, seed=0, delimiter=','):
+    """Trains models with every number of buckets and without hashing on the generated dataset and
+    scores them on another dataset of the same parameters. Returns a list of dicts: buckets (0 without hashing),
+    accuracy, size of w_c and the collision report of hashing the exact vocabulary."""
+    interface_core = core.InterfaceCore(core.MODULES_HEADLESS, headless=True)
+    interface_data = interface_core.get_interface_data()
+    interface_train = interface_core.get_interface_train()
+    interface_predict = interface_core.get_interface_by_name('predict')
+    interface_train.nbc_set_cache(None)
+    with tempfile.TemporaryDirectory() as directory:
+        train_name, test_name = os.path.join(directory, 'train.csv'), os.path.join(directory, 'test.csv')
+        generate(train_name, seed=seed, delimiter=delimiter, **parameters)
+        generate(test_name, seed=seed + 1, delimiter=delimiter, **parameters)
+        interface_data.set_train_file_name(train_name)
+        interface_train.nbc_start_train(delimiter)
+        report = [{'buckets': 0, 'accuracy': interface_predict.nbc_evaluate(test_name, delimiter),
+                   'w_c_bytes': int(interface_data.get_model_nbc().w_c.nbytes)}]
+        collisions = [interface_train.nbc_collision_report(buckets) for buckets in buckets_list]
+        for buckets, collision in zip(buckets_list, collisions):
+            interface_train.nbc_start_train(delimiter, buckets=buckets)
+            report.append(dict(collision, accuracy=interface_predict.nbc_evaluate(test_name, delimiter),
+                               w_c_bytes=int(interface_data.get_model_nbc().w_c.nbytes)))
+    return report
+
+
+def compare(baseline, current, threshold):
+    """Returns lines of the report and the number of regressions: phases and peaks of memory of current results,
+    which are bigger than in the baseline by more than the threshold (0.1 is 10 %)."""
+    lines, regressions = [], 0
+    for name, case in current['cases'].items():
+        base = baseline['cases'].get(name)
+        if base is None:
+            lines.append('%s: not in the baseline' % name)
+            continue
+        if base['parameters'] != case['parameters']:
+            lines.append('%s: parameters differ from the baseline' % name)
+            continue
+        for group, floor in (('seconds', _MIN_SECONDS), ('peak_bytes', 0)):
+            for key, value in case[group].items():
+                old = base[group].get(key)
+                if old is None:
+                    continue
+                change = (value - old) / old if old > floor else 0.0
+                regressed = change > threshold and value > floor
+                regressions += regressed
+                lines.append('%-8s %-18s %-11s %14.6g -> %14.6g %+7.1f %%%s' % (
+                    name, key, group, old, value, 100 * change, '  REGRESSION' if regressed else ''))
+    return lines, regressions
+
+
+def _environment():
+    """Returns a dict describing the machine and versions of libraries."""
+    return {'python': platform.python_version(), 'numpy': numpy.__version__, 'pandas': pandas.__version__,
+            'machine': platform.machine(), 'processor': platform.processor(), 'cpus': os.cpu_count(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def main(argv=None):
+    """Parses command line arguments and runs the benchmark or compares results."""
+    parser = argparse.ArgumentParser(description='Benchmarks training and scoring of NBC models.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help='runs cases and writes results to JSON')
+    run_parser.add_argument('-p', '--preset', action='append', choices=sorted(PRESETS),
+                            help='preset case, may be repeated (default: small)')
+    for parameter in ('rows', 'columns', 'classes', 'vocabulary'):
+        run_parser.add_argument('--' + parameter, type=int, help='custom case: ' + parameter)
+    run_parser.add_argument('--zipf', type=float, default=1.1, help='custom case: Zipf exponent (default: 1.1)')
+    run_parser.add_argument('-r', '--repeat', type=int, default=3, help='runs of every case (default: 3)')
+    run_parser.add_argument('-s', '--seed', type=int, default=0, help='seed of the generator (default: 0)')
+    run_parser.add_argument('-b', '--memory-budget', type=int, default=None, help='memory budget of training')
+    run_parser.add_argument('-w', '--workers', type=int, default=1, help='processes counting shards')
+    run_parser.add_argument('-o', '--output', help='JSON file of results (default: standard output)')
+    run_parser.add_argument('-c', '--compare', help='baseline JSON file to compare results with')
+    run_parser.add_argument('-t', '--threshold', type=float, default=0.1, help='allowed slowdown (default: 0.1)')
+    hashing_parser = commands.add_parser('hashing', help='compares accuracy of hashed and exact vocabularies')
+    hashing_parser.add_argument('-p', '--preset', choices=sorted(PRESETS), default='small',
+                                help='dataset preset (default: small)')
+    hashing_parser.add_argument('-B', '--buckets', type=int, nargs='+', default=[1 << 8, 1 << 12, 1 << 16],
+                                help='numbers of buckets (default: 256 4096 65536)')
+    hashing_parser.add_argument('-s', '--seed', type=int, default=0, help='seed of the generator (default: 0)')
+    hashing_parser.add_argument('-o', '--output', help='JSON file of results')
+    compare_parser = commands.add_parser('compare', help='compares results with a baseline')
+    compare_parser.add_argument('baseline', help='JSON file of baseline results')
+    compare_parser.add_argument('current', help='JSON file of current results')
+    compare_parser.add_argument('-t', '--threshold', type=float, default=0.1, help='allowed slowdown (default: 0.1)')
+    args = parser.parse_args(argv)
+
+    if args.command == 'hashing':
+        report = hashing_report(PRESETS[args.preset], args.buckets, args.seed)
+        print('%10s %10s %12s %10s %10s' % ('buckets', 'accuracy', 'w_c bytes', 'collided', 'occurrences'))
+        for item in report:
+            print('%10s %10.4f %12d %10s %10s' % (
+                item['buckets'] or 'exact', item['accuracy'], item['w_c_bytes'],
+                '%.2f%%' % (100 * item['collision_rate']) if item['buckets'] else '-',
+                '%.2f%%' % (100 * item['colliding_occurrences_share']) if item['buckets'] else '-'))
+        if args.output is not None:
+            with open(args.output, 'w') as file:
+                json.dump(report, file, indent=4)
+        return 0
+    if args.command == 'run':
+        cases = {name: PRESETS[name] for name in args.preset or []}
+        if args.rows is not None:
+            cases['custom'] = {'rows': args.rows, 'columns': args.columns or 10, 'classes': args.classes or 4,
+                               'vocabulary': args.vocabulary or 1000, 'zipf': args.zipf}
+        if not cases:
+            cases['small'] = PRESETS['small']
+        results = {'environment': _environment(), 'cases': {}}
+        for name, parameters in cases.items():
+            results['cases'][name] = run_case(name, parameters, args.repeat, args.memory_budget, args.workers,
+                                              args.seed)
+            print('%s: %.0f rows/s' % (name, results['cases'][name]['train_rows_per_second']), file=sys.stderr)
+        if args.output is None:
+            json.dump(results, sys.stdout, indent=4)
+        else:
+            with open(args.output, 'w') as file:
+                json.dump(results, file, indent=4)
+        if args.compare is None:
+            return 0
+        current = results
+    else:
+        with open(args.current) as file:
+            current = json.load(file)
+    with open(args.baseline if args.command == 'compare' else args.compare) as file:
+        baseline = json.load(file)
+    lines, regressions = compare(baseline, current, args.threshold)
+    print('\n'.join(lines))
+    print('%d regressions' % regressions)
+    return 1 if regressions else 0
+
+
+""" E N T R Y   P O I N T:  #########################################################################################"""
+
+
+if __name__ == '__main__':
+    sys.exit(main())
+
+
+""" E N D   O F   F I L E.  #########################################################################################"""
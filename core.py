@@ -1,8 +1,13 @@
 """ I M P O R T:  ###################################################################################################"""
 
 
+import collections
+import functools
 import importlib
 import importlib.util
+import os
+import threading
+import time
 
 
 """ I N T E R F A C E:  #############################################################################################"""
@@ -15,14 +20,20 @@ class InterfaceCore:
         loaded modules. To obtain the interface of a dynamically loaded module,
         it is supposed to use the method get_interface_by_name. Also the class
          allows to call an error message window, using the UI interface.
+        Modules are imported on the first use of their interfaces.
+        The opt-in profiler records spans of work in modules and calls between modules.
+        The message bus delivers published messages and requests to pools of modules.
 
     Attributes:
         _main_module_object: An instance of the main class.
     """
 
-    def __init__(self, module_list: list):
-        """Inits the interface instance."""
+    def __init__(self, module_list: list, headless: bool = False):
+        """Inits the interface instance.
+        If headless is True, the UI module is never loaded."""
         self._main_module_object = _Core(self)
+        if headless:
+            module_list = [mod for mod in module_list if mod not in _GUI_MODULES]
         self._main_module_object.load_interface_list(module_list)
 
     def get_interface_ui(self):
@@ -45,6 +56,90 @@ class InterfaceCore:
         """Shows error message in UI."""
         self._main_module_object.show_error(text_error)
 
+    def get_load_times(self):
+        """Returns a dict with seconds spent on start of the core and on loading of every loaded module.
+        Time of a module does not include modules, which were loaded by it."""
+        return self._main_module_object.get_load_times()
+
+    def get_profiler(self):
+        """Returns the profiler, which modules use to record spans of work, see _Profiler.span."""
+        return self._main_module_object.profiler
+
+    def enable_profiling(self, trace_memory: bool = False):
+        """Starts recording spans and calls between modules. If trace_memory is True,
+        peaks of allocated memory are traced too, which makes the program several times slower."""
+        self._main_module_object.profiler.enable(trace_memory)
+
+    def disable_profiling(self):
+        """Stops recording, recorded spans are kept."""
+        self._main_module_object.profiler.disable()
+
+    def clear_profile(self):
+        """Removes recorded spans."""
+        self._main_module_object.profiler.clear()
+
+    def get_profile(self):
+        """Returns a list of dicts with calls, wall and CPU seconds, rows, rows per second and
+        the peak of allocated bytes per span name, the slowest first."""
+        return self._main_module_object.profiler.get_summary()
+
+    def export_profile(self, file_name: str, chrome_trace: bool = False):
+        """Writes recorded spans to the JSON file, or in the Chrome trace format (chrome://tracing, Perfetto)."""
+        self._main_module_object.profiler.export(file_name, chrome_trace)
+
+    def subscribe(self, topic: str, callback, module: str = 'core'):
+        """Calls callback(*args, **kwargs) in the pool of the module for every message published to the topic.
+        Returns the token of the subscription."""
+        return self._main_module_object.bus.subscribe(topic, callback, module)
+
+    def unsubscribe(self, token: int):
+        """Cancels the subscription."""
+        self._main_module_object.bus.unsubscribe(token)
+
+    def publish(self, topic: str, *args, **kwargs):
+        """Publishes the message to subscribers of the topic without waiting for them.
+        Returns a list of futures (concurrent.futures.Future) of their callbacks."""
+        return self._main_module_object.bus.publish(topic, args, kwargs)
+
+    def request(self, module: str, method: str, *args, **kwargs):
+        """Calls the method of the interface of the module in the pool of the module and returns the future
+        of its result. If the module has a process pool, the function of the module with this name is called,
+        these are train.nbc_train, predict.nbc_predict and predict.nbc_evaluate, which take the model."""
+        return self._main_module_object.bus.request(module, method, args, kwargs)
+
+    def set_module_pool(self, module: str, kind: str = 'thread', workers: int = 1):
+        """Sets the pool ('thread' or 'process'), which runs callbacks and requests of the module.
+        A module has one thread by default, so its calls run one at a time in order."""
+        self._main_module_object.bus.set_pool(module, kind, workers)
+
+    def get_bus_stats(self):
+        """Returns a dict with submitted, completed, failed and pending calls, the peak of pending calls and
+        the dispatch latency (from submitting to start) per module, and messages and subscribers per topic."""
+        return self._main_module_object.bus.get_stats()
+
+    def shutdown_bus(self, wait: bool = True):
+        """Shuts the pools of the bus down, they are created again by the next message."""
+        self._main_module_object.bus.shutdown(wait)
+
+
+""" C O N S T A N T S:  #############################################################################################"""
+
+
+# Modules of the graphical interface, which are not loaded in the headless mode.
+_GUI_MODULES = ('ui',)
+
+# Modules of the application.
+MODULES = ['data', 'train', 'predict', 'fpga', 'serve', 'ui']
+
+# Modules for scripts without the graphical interface.
+MODULES_HEADLESS = [mod for mod in MODULES if mod not in _GUI_MODULES]
+
+# Names of executors of concurrent.futures for pools of the message bus, they are imported by the first message.
+_BUS_EXECUTORS = {'thread': 'ThreadPoolExecutor', 'process': 'ProcessPoolExecutor'}
+
+# Number of the last dispatch latencies of a module, which percentiles are computed over.
+_BUS_LATENCY_WINDOW = 10000
+
 
 """ M A I N   C L A S S:  ###########################################################################################"""
 
@@ -57,14 +152,27 @@ class _Core:
 
     Attributes:
         _interface_dict: Consists instances of interfaces
-            of the all loaded modules.
+            of the all loaded modules, or their proxies until the first use.
         _interface_core: An instance of the core interface.
+        _load_times: Seconds spent on loading of every module.
+        _loading: Stack of [module name, seconds of nested loads] of modules being loaded.
+        load_lock: A reentrant lock held while a module is loaded, interfaces of loaded modules take
+            interfaces of other modules in the same thread.
+        profiler: An instance of the profiler.
+        bus: An instance of the message bus.
     """
 
     def __init__(self, interface_core):
         """Inits the core instance."""
+        start = time.perf_counter()
         self._interface_dict = {}
         self._interface_core = interface_core
+        self._load_times = {}
+        self._loading = []
+        self.load_lock = threading.RLock()
+        self.profiler = _Profiler()
+        self.bus = _Bus(self)
+        self._load_times['core'] = time.perf_counter() - start
 
     def _check_module(self, module):
         """Checks if module can be loaded."""
@@ -76,8 +184,18 @@ class _Core:
             return True
 
     def _load_interface(self, module_name):
-        """Imports module and adds interface."""
-        self._interface_dict[module_name] = importlib.import_module(module_name).get_interface(self._interface_core)
+        """Imports module and returns its interface."""
+        start = time.perf_counter()
+        self._loading.append([module_name, 0.0])
+        try:
+            interface = importlib.import_module(module_name).get_interface(self._interface_core)
+        finally:
+            _, nested = self._loading.pop()
+        seconds = time.perf_counter() - start
+        if self._loading:
+            self._loading[-1][1] += seconds
+        self._load_times[module_name] = seconds - nested
+        return interface
 
     # TODO: Make error message in separate window.
     def show_error(self, text_error):
@@ -85,23 +203,426 @@ class _Core:
         print(text_error)
 
     def load_interface_list(self, module_list):
-        """Loads modules in the list."""
+        """Adds proxies of interfaces of modules in the list, modules are imported on the first use."""
         for mod in module_list:
             if self._check_module(mod):
-                self._load_interface(mod)
+                self._interface_dict[mod] = _InterfaceProxy(self, mod)
             else:
                 self.show_error('Interface loading error!')
 
     def get_interface(self, interface_name):
-        """Returns any loaded interface instance by name."""
+        """Returns the proxy of any loaded interface instance by name."""
         return self._interface_dict[interface_name]
 
+    def load_interface(self, module_name):
+        """Returns the interface of the module, importing the module on the first call."""
+        return self._load_interface(module_name)
+
+    def get_load_times(self):
+        """Returns a dict with seconds spent on start and on loading of modules."""
+        return dict(self._load_times)
+
+
+""" S E C O N D A R Y   C L A S S:  #################################################################################"""
+
+
+class _InterfaceProxy:
+    """The proxy of an interface of a module.
+
+    Interfaces of other modules are taken in constructors of interfaces, so they get proxies
+        and the module is imported only when an attribute of its interface is used.
+        When the profiler is on, methods called through the proxy are recorded as calls between modules.
+
+    Attributes:
+        _core: An instance of the main class of the core module.
+        _module_name: Name of the module.
+        _interface: The interface of the module, None until the module is imported.
+    """
+
+    def __init__(self, core, module_name):
+        """Inits the proxy instance."""
+        self._core = core
+        self._module_name = module_name
+        self._interface = None
+
+    def __getattr__(self, name):
+        """Returns the attribute of the interface, importing the module if necessary.
+        The module is loaded under the lock of the core and checked again, so threads using the proxy
+            at the same time get one interface."""
+        interface = self._interface
+        if interface is None:
+            with self._core.load_lock:
+                if self._interface is None:
+                    self._interface = self._core.load_interface(self._module_name)
+                interface = self._interface
+        attribute = getattr(interface, name)
+        if self._core.profiler.enabled and callable(attribute):
+            return self._core.profiler.wrap('%s.%s' % (self._module_name, name), attribute)
+        return attribute
+
+
+class _NullSpan:
+    """The span, which records nothing. It is used while the profiler is off."""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def add_rows(self, rows):
+        """Does nothing."""
+
+
+class _Span:
+    """The span of work recorded by the profiler.
+
+    Attributes:
+        name: Name of the span, 'module.phase'.
+        category: 'phase' for work inside a module, 'call' for calls between modules.
+        rows: Number of rows processed in the span.
+        peak: The largest peak of allocated memory of nested spans.
+        _profiler: An instance of the profiler.
+        _start, _cpu, _memory: Wall time, CPU time of the thread and allocated bytes at the start.
+    """
+
+    __slots__ = ('name', 'category', 'rows', 'peak', '_profiler', '_start', '_cpu', '_memory')
+
+    def __init__(self, profiler, name, category):
+        """Inits the span instance."""
+        self.name = name
+        self.category = category
+        self.rows = 0
+        self.peak = 0
+        self._profiler = profiler
+
+    def __enter__(self):
+        self._profiler.enter(self)
+        self._memory = 0
+        if self._profiler.trace_memory:
+            import tracemalloc
+            self._memory = tracemalloc.get_traced_memory()[0]
+        self._cpu = time.thread_time()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall = time.perf_counter() - self._start
+        cpu = time.thread_time() - self._cpu
+        self._profiler.exit(self, self._start, wall, cpu, self._memory)
+        return False
+
+    def add_rows(self, rows):
+        """Adds processed rows."""
+        self.rows += rows
+
+
+class _Profiler:
+    """The opt-in profiler.
+
+    Spans are recorded with `with profiler.span(name) as span:`. While the profiler is off,
+        span returns a shared span, which does nothing. Peaks of memory are traced
+        by tracemalloc, they are counted for the whole process, not for a thread. tracemalloc and json
+        are imported when they are used, so the profiler costs nothing at startup while it is off.
+
+    Attributes:
+        enabled: True if spans are recorded.
+        trace_memory: True if peaks of allocated memory are traced.
+        _events: Recorded spans as dicts.
+        _lock: A lock for the list of recorded spans.
+        _local: Thread local stack of open spans.
+        _epoch: Wall time, which time of events is counted from.
+        _tracemalloc: True if tracemalloc was started by the profiler.
+    """
+
+    def __init__(self):
+        """Inits the profiler instance."""
+        self.enabled = False
+        self.trace_memory = False
+        self._events = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._epoch = time.perf_counter()
+        self._tracemalloc = False
+
+    def enable(self, trace_memory=False):
+        """Starts recording."""
+        self.trace_memory = trace_memory
+        if trace_memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self._tracemalloc = True
+        self.enabled = True
+
+    def disable(self):
+        """Stops recording."""
+        self.enabled = False
+        self.trace_memory = False
+        if self._tracemalloc:
+            import tracemalloc
+            tracemalloc.stop()
+            self._tracemalloc = False
+
+    def clear(self):
+        """Removes recorded spans."""
+        with self._lock:
+            self._events = []
+
+    def span(self, name, category='phase'):
+        """Returns a new span, or the shared span, which records nothing, if the profiler is off."""
+        return _Span(self, name, category) if self.enabled else _NULL_SPAN
+
+    def wrap(self, name, function):
+        """Returns the function, which records its calls as spans."""
+        def wrapper(*args, **kwargs):
+            with _Span(self, name, 'call'):
+                return function(*args, **kwargs)
+        return wrapper
+
+    def enter(self, span):
+        """Pushes the span to the stack of open spans of the thread."""
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(span)
+        if self.trace_memory:
+            import tracemalloc
+            tracemalloc.reset_peak()
+
+    def exit(self, span, start, wall, cpu, memory):
+        """Pops the span from the stack and records it."""
+        stack = self._local.stack
+        stack.pop()
+        peak = 0
+        if self.trace_memory:
+            import tracemalloc
+            if tracemalloc.is_tracing():
+                peak = max(span.peak, tracemalloc.get_traced_memory()[1])
+                if stack:
+                    stack[-1].peak = max(stack[-1].peak, peak)
+                tracemalloc.reset_peak()
+                peak -= memory
+        with self._lock:
+            self._events.append({'name': span.name, 'category': span.category, 'start': start - self._epoch,
+                                 'wall': wall, 'cpu': cpu, 'rows': span.rows, 'peak_bytes': max(peak, 0),
+                                 'thread': threading.get_ident(), 'depth': len(stack)})
+
+    def get_events(self):
+        """Returns a copy of the list of recorded spans."""
+        with self._lock:
+            return list(self._events)
+
+    def get_summary(self):
+        """Returns recorded spans summed up by name, the slowest first."""
+        summary = {}
+        for event in self.get_events():
+            item = summary.setdefault(event['name'], {'name': event['name'], 'category': event['category'],
+                                                      'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'rows': 0,
+                                                      'peak_bytes': 0})
+            item['calls'] += 1
+            item['wall'] += event['wall']
+            item['cpu'] += event['cpu']
+            item['rows'] += event['rows']
+            item['peak_bytes'] = max(item['peak_bytes'], event['peak_bytes'])
+        for item in summary.values():
+            item['rows_per_second'] = item['rows'] / item['wall'] if item['wall'] else 0.0
+        return sorted(summary.values(), key=lambda item: item['wall'], reverse=True)
+
+    def export(self, file_name, chrome_trace=False):
+        """Writes recorded spans to the JSON file."""
+        import json
+        events = self.get_events()
+        if chrome_trace:
+            content = {'displayTimeUnit': 'ms',
+                       'traceEvents': [{'name': event['name'], 'cat': event['category'], 'ph': 'X',
+                                        'ts': event['start'] * 1e6, 'dur': event['wall'] * 1e6, 'pid': os.getpid(),
+                                        'tid': event['thread'],
+                                        'args': {'cpu_ms': event['cpu'] * 1e3, 'rows': event['rows'],
+                                                 'peak_bytes': event['peak_bytes']}} for event in events]}
+        else:
+            content = {'summary': self.get_summary(), 'events': events}
+        with open(file_name, 'w') as file:
+            json.dump(content, file, indent=4)
+
+
+# The span used while the profiler is off.
+_NULL_SPAN = _NullSpan()
+
+
+class _Bus:
+    """The message bus of the core module.
+
+    Messages published to a topic are delivered to callbacks of its subscribers and requests call
+        methods of interfaces. Both run in the pool of the module, which handles them, and return futures,
+        so the caller does not wait. A module has a thread pool of one worker by default, so its calls
+        run one at a time in order. A process pool calls functions of the module by name instead
+        of methods of its interface, which keeps state of this process, and their arguments and results
+        must be picklable. These functions keep no state, e.g. predict.nbc_evaluate takes the model.
+        Pools are created by the first message, so the bus costs nothing until it is used.
+
+    Attributes:
+        _core: An instance of the main class of the core module.
+        _lock: A lock of the bus.
+        _pools: A dict module: executor.
+        _settings: A dict module: (kind, workers) of pools, which are not default.
+        _subscribers: A dict topic: list of (token, module, callback).
+        _serial: Token of the next subscription.
+        _published: A dict topic: number of published messages.
+        _stats: A dict module: counters of calls.
+        _latencies: A dict module: the last dispatch latencies in seconds.
+    """
+
+    def __init__(self, core):
+        """Inits the bus instance."""
+        self._core = core
+        self._lock = threading.Lock()
+        self._pools = {}
+        self._settings = {}
+        self._subscribers = {}
+        self._serial = 0
+        self._published = collections.Counter()
+        self._stats = {}
+        self._latencies = {}
+
+    def _get_pool(self, module):
+        """Returns the pool of the module, creates it on the first call."""
+        pool = self._pools.get(module)
+        if pool is None:
+            import concurrent.futures
+            kind, workers = self._settings.get(module, ('thread', 1))
+            executor = getattr(concurrent.futures, _BUS_EXECUTORS[kind])
+            if kind == 'thread':
+                pool = executor(max_workers=workers, thread_name_prefix='bus-%s' % module)
+            else:
+                pool = executor(max_workers=workers)
+            self._pools[module] = pool
+            self._stats.setdefault(module, {'submitted': 0, 'completed': 0, 'errors': 0, 'pending': 0,
+                                            'peak_pending': 0})
+            self._latencies.setdefault(module, collections.deque(maxlen=_BUS_LATENCY_WINDOW))
+        return pool
+
+    def _dispatch(self, module, function, args, kwargs):
+        """Submits the call to the pool of the module, returns the future of its result."""
+        import concurrent.futures
+        future = concurrent.futures.Future()
+        with self._lock:
+            pool = self._get_pool(module)
+            stats = self._stats[module]
+            stats['submitted'] += 1
+            stats['pending'] += 1
+            stats['peak_pending'] = max(stats['peak_pending'], stats['pending'])
+        task = pool.submit(_run_task, time.monotonic(), function, args, kwargs)
+        task.add_done_callback(lambda task: self._finish(module, task, future))
+        return future
+
+    def _finish(self, module, task, future):
+        """Counts the finished call and sets the result of its future."""
+        try:
+            latency, result, error = task.result()
+        except BaseException as pool_error:
+            # The pool failed, e.g. a worker process died
+            latency, result, error = None, None, pool_error
+        with self._lock:
+            stats = self._stats[module]
+            stats['completed'] += 1
+            stats['pending'] -= 1
+            stats['errors'] += error is not None
+            if latency is not None:
+                self._latencies[module].append(latency)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def subscribe(self, topic, callback, module):
+        """Adds the subscription, returns its token."""
+        with self._lock:
+            self._serial += 1
+            self._subscribers.setdefault(topic, []).append((self._serial, module, callback))
+            return self._serial
+
+    def unsubscribe(self, token):
+        """Removes the subscription."""
+        with self._lock:
+            for topic, subscribers in self._subscribers.items():
+                self._subscribers[topic] = [subscriber for subscriber in subscribers if subscriber[0] != token]
+
+    def publish(self, topic, args, kwargs):
+        """Dispatches the message to the subscribers of the topic, returns futures of their callbacks."""
+        with self._lock:
+            self._published[topic] += 1
+            subscribers = list(self._subscribers.get(topic, ()))
+        return [self._dispatch(module, callback, args, kwargs) for _, module, callback in subscribers]
+
+    def request(self, module, method, args, kwargs):
+        """Dispatches the call of the method of the module, returns the future of its result."""
+        if self._settings.get(module, ('thread',))[0] == 'process':
+            function = functools.partial(_call_function, module, method)
+        else:
+            function = getattr(self._core.get_interface(module), method)
+        return self._dispatch(module, function, args, kwargs)
+
+    def set_pool(self, module, kind, workers):
+        """Sets the pool of the module, the old pool finishes its calls in background."""
+        if kind not in _BUS_EXECUTORS:
+            raise ValueError('Unknown pool %r, it must be one of %s' % (kind, ', '.join(_BUS_EXECUTORS)))
+        with self._lock:
+            self._settings[module] = (kind, workers)
+            pool = self._pools.pop(module, None)
+        if pool is not None:
+            pool.shutdown(wait=False)
+
+    def shutdown(self, wait=True):
+        """Shuts the pools down."""
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.shutdown(wait=wait)
+
+    def get_stats(self):
+        """Returns a dict with counters and latencies of modules and counters of topics."""
+        with self._lock:
+            modules = {}
+            for module, stats in self._stats.items():
+                latencies = sorted(self._latencies[module]) or [0.0]
+                kind, workers = self._settings.get(module, ('thread', 1))
+                modules[module] = dict(stats, pool=kind, workers=workers,
+                                       latency_mean_ms=1000 * sum(latencies) / len(latencies),
+                                       latency_p99_ms=1000 * latencies[min(int(0.99 * len(latencies)),
+                                                                           len(latencies) - 1)],
+                                       latency_max_ms=1000 * latencies[-1])
+            topics = {topic: {'published': self._published[topic],
+                              'subscribers': len(self._subscribers.get(topic, ()))}
+                      for topic in set(self._published) | set(self._subscribers)}
+        return {'modules': modules, 'topics': topics}
+
+
+""" F U N C T I O N S:  #############################################################################################"""
+
+
+def _run_task(submitted, function, args, kwargs):
+    """Calls the function, returns the dispatch latency, the result and the exception or None.
+    Runs in a pool of the bus, the monotonic clock is shared by processes of the machine."""
+    latency = time.monotonic() - submitted
+    try:
+        return latency, function(*args, **kwargs), None
+    except Exception as error:
+        return latency, None, error
+
+
+def _call_function(module, name, *args, **kwargs):
+    """Calls the function of the module. Runs in a process pool of the bus."""
+    return getattr(importlib.import_module(module), name)(*args, **kwargs)
+
 
 """ E N T R Y   P O I N T:  #########################################################################################"""
 
 
 if __name__ == '__main__':
-    core = InterfaceCore(['data', 'train', 'ui'])
+    core = InterfaceCore(MODULES)
     interface_ui = core.get_interface_ui()
     #####################################
     # CALLING METHOD FROM OTHER MODULE! #
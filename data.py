@@ -1,8 +1,18 @@
 """ I M P O R T:  ###################################################################################################"""
 
 
+import atexit
+import collections
 import core
-import copy
+import json
+import numpy
+import os
+import pandas
+import shutil
+import struct
+import sys
+import tempfile
+import threading
 
 
 """ G E T   I N T E R F A C E   I N S T A N C E:  ###################################################################"""
@@ -40,15 +50,66 @@ class InterfaceData:
         """Returns the name of file with training data."""
         return self._main_module_object.get_train_file_name()
 
-    def set_ready_model_nbc(self, model: dict):
-        """Sets the variable with NBC model parameters."""
+    def set_ready_model_nbc(self, model: 'ModelNBC'):
+        """Publishes a new version of NBC model. The model is frozen and must not be changed after.
+        The version is published to the 'data.model_nbc' topic of the message bus of the core."""
         self._main_module_object.set_ready_model_nbc(model)
 
     def get_ready_model_nbc(self):
-        """Returns a copy of variable with NBC model parameters.
+        """Returns a copy of variable with NBC model parameters in the dict form.
         Keys in model: 'v': _v, 'd_c': _d_c, 'l_c': _l_c, 'w_c': _w_c."""
         return self._main_module_object.get_ready_model_nbc()
 
+    def get_model_nbc(self):
+        """Returns the current read-only NBC model, see ModelNBC. The model is not copied."""
+        return self._main_module_object.get_model_nbc()
+
+    def get_model_nbc_version(self):
+        """Returns the version of the current NBC model, it grows with every published model."""
+        return self._main_module_object.get_model_nbc_snapshot()[0]
+
+    def get_model_nbc_snapshot(self):
+        """Returns the version and the current NBC model, which belong together."""
+        return self._main_module_object.get_model_nbc_snapshot()
+
+    def save_model_nbc(self, file_name: str):
+        """Writes the NBC model to the binary file."""
+        self._main_module_object.save_model_nbc(file_name)
+
+    def load_model_nbc(self, file_name: str):
+        """Maps the binary file with NBC model into memory and sets it as the NBC model."""
+        self._main_module_object.load_model_nbc(file_name)
+
+    def add_model_nbc(self, name: str, model: 'ModelNBC' = None):
+        """Keeps the model (the current NBC model if None) in the registry under the name.
+        Models not used recently are written to disk when the registry is over its memory budget."""
+        self._main_module_object.add_model_nbc(name, model)
+
+    def get_model_nbc_by_name(self, name: str):
+        """Returns the model of the registry, it is mapped from disk again if it was evicted. Raises KeyError."""
+        return self._main_module_object.get_model_nbc_by_name(name)
+
+    def publish_model_nbc(self, name: str):
+        """Publishes the model of the registry as the current NBC model."""
+        self._main_module_object.set_ready_model_nbc(self._main_module_object.get_model_nbc_by_name(name))
+
+    def remove_model_nbc(self, name: str):
+        """Removes the model from the registry and its file from disk."""
+        self._main_module_object.remove_model_nbc(name)
+
+    def get_model_nbc_names(self):
+        """Returns names of models in the registry, the least recently used first."""
+        return self._main_module_object.get_model_nbc_names()
+
+    def set_model_registry(self, max_bytes: int = None, directory: str = None):
+        """Sets the memory budget of the registry in bytes and the directory of evicted models.
+        The directory is temporary by default. Models over the new budget are evicted at once."""
+        self._main_module_object.set_model_registry(max_bytes, directory)
+
+    def get_model_registry_stats(self):
+        """Returns a dict with models, resident models and bytes, the budget, hits, reloads and evictions."""
+        return self._main_module_object.get_model_registry_stats()
+
 
 """ M A I N   C L A S S:  ###########################################################################################"""
 
@@ -57,37 +118,530 @@ class _Data:
     """The main class of the Data module.
 
     This class contains methods for storing and retrieving
-        data necessary for the entire program.
+        data necessary for the entire program. Models are published as
+        read-only snapshots: writers replace the snapshot under the lock,
+        readers take the current reference without locking or copying.
 
     Attributes:
         _interface_core: An instance of the core interface.
+        _lock: A lock for writers.
         _train_file_name: Name of file with training data.
-        _ready_model_nbc: A variable with NBC model parameters.
+        _snapshot_nbc: A tuple (version, NBC model parameters), see ModelNBC.
+        _registry: Named models, see _ModelRegistry.
     """
 
     def __init__(self, interface_core):
         """Inits the main class instance."""
         self._interface_core = interface_core
+        self._lock = threading.Lock()
         self._train_file_name = None
-        self._ready_model_nbc = None
+        self._snapshot_nbc = (0, None)
+        self._registry = _ModelRegistry(_REGISTRY_MAX_BYTES)
 
-    # TODO: Make LOCK in case of more then one thread calling this method.
     def set_train_file_name(self, file_name):
         """Sets the name of file with training data."""
-        self._train_file_name = file_name
+        with self._lock:
+            self._train_file_name = file_name
 
     def get_train_file_name(self):
         """Returns the name of file with training data."""
-        return copy.deepcopy(self._train_file_name)
+        return self._train_file_name
 
-    # TODO: Make LOCK in case of more then one thread calling this method.
     def set_ready_model_nbc(self, model):
-        """Sets the variable with NBC model parameters."""
-        self._ready_model_nbc = model
+        """Publishes a new snapshot with NBC model parameters."""
+        model.freeze()
+        with self._lock:
+            self._snapshot_nbc = (self._snapshot_nbc[0] + 1, model)
+            version = self._snapshot_nbc[0]
+        self._interface_core.publish('data.model_nbc', version)
 
     def get_ready_model_nbc(self):
-        """Returns a copy of variable with NBC model parameters."""
-        return copy.deepcopy(self._ready_model_nbc)
+        """Returns a copy of variable with NBC model parameters in the dict form."""
+        model = self._snapshot_nbc[1]
+        if model is None:
+            return None
+        return model.to_dict()
+
+    def get_model_nbc(self):
+        """Returns variable with NBC model parameters."""
+        return self._snapshot_nbc[1]
+
+    def get_model_nbc_snapshot(self):
+        """Returns the snapshot (version, NBC model parameters)."""
+        return self._snapshot_nbc
+
+    def save_model_nbc(self, file_name):
+        """Writes the variable with NBC model parameters to the binary file."""
+        self._snapshot_nbc[1].save(file_name)
+
+    def load_model_nbc(self, file_name):
+        """Publishes NBC model parameters from the binary file."""
+        self.set_ready_model_nbc(ModelNBC.load(file_name))
+
+    def add_model_nbc(self, name, model):
+        """Keeps the model or the current one in the registry."""
+        model = self._snapshot_nbc[1] if model is None else model
+        if model is None:
+            raise ValueError('There is no NBC model to add')
+        model.freeze()
+        self._registry.add(name, model)
+
+    def get_model_nbc_by_name(self, name):
+        """Returns the model of the registry."""
+        return self._registry.get(name)
+
+    def remove_model_nbc(self, name):
+        """Removes the model from the registry."""
+        self._registry.remove(name)
+
+    def get_model_nbc_names(self):
+        """Returns names of models in the registry."""
+        return self._registry.get_names()
+
+    def set_model_registry(self, max_bytes, directory):
+        """Sets the memory budget and the directory of the registry."""
+        self._registry.configure(max_bytes, directory)
+
+    def get_model_registry_stats(self):
+        """Returns stats of the registry."""
+        return self._registry.get_stats()
+
+
+""" C O N S T A N T S:  #############################################################################################"""
+
+
+# Default memory budget of the model registry.
+_REGISTRY_MAX_BYTES = 1 << 30
+
+# Binary model file: header, table of sections (offset, size) and the sections, aligned for numpy.memmap.
+# Header: magic, version, classes, tokens, v, buckets since version 2, the algorithm since version 3 and
+# bytes of a count since version 4. w_c is a dense matrix before version 4 and a CSR matrix since then.
+_MODEL_MAGIC = b'NBCM'
+_MODEL_VERSION = 4
+_MODEL_PREFIX = struct.Struct('<4sI')
+_MODEL_HEADERS = {1: struct.Struct('<4sIQQQ'), 2: struct.Struct('<4sIQQQQ'), 3: struct.Struct('<4sIQQQQQ'),
+                  4: struct.Struct('<4sIQQQQQQ')}
+_MODEL_SECTION = struct.Struct('<QQ')
+_MODEL_SECTIONS = ('labels', 'token_blob', 'token_offsets', 'd_c', 'l_c', 'order', 'w_c_indptr', 'w_c_indices',
+                   'w_c_data')
+_MODEL_DENSE_SECTIONS = ('labels', 'token_blob', 'token_offsets', 'd_c', 'l_c', 'order', 'w_c')
+_MODEL_ALIGNMENT = 64
+
+# Registry of algorithms of naive bayesian classifier: name: (title, statistic of counts, which their models keep
+# in w_c: 'w_c' numbers of token occurrences or 'df_c' numbers of rows containing the token).
+# Other modules derive their tables of algorithms from it. Numbers of algorithms in this order are written
+# in model files, so new algorithms are appended.
+ALGORITHM_REGISTRY = {'multinomial': ('Multinomial naive Bayes', 'w_c'),
+                      'bernoulli': ('Bernoulli naive Bayes', 'df_c'),
+                      'complement': ('Complement naive Bayes', 'w_c')}
+
+# Names of algorithms in order of their numbers in model files.
+ALGORITHMS = tuple(ALGORITHM_REGISTRY)
+
+# Parameters of the 32-bit FNV-1a hash of tokens.
+_FNV_OFFSET = 2166136261
+_FNV_PRIME = 16777619
+
+
+""" M O D E L   C L A S S:  #########################################################################################"""
+
+
+class ModelNBC:
+    """The parameters of naive bayesian classifier model.
+
+    Counts are kept in a sparse matrix with one shared vocabulary instead of a dict
+        of token counts per class, see CountMatrix. Classes are in order of sorted labels.
+        A model loaded from a binary file keeps its arrays in the mapped file
+        and decodes tokens only when they are used. A published model is frozen,
+        its arrays are read-only, so it can be shared between threads without copies.
+        In the hashing mode tokens are numbers of buckets, see hash_tokens.
+        The algorithm tells the predict module how to score rows with the counts.
+
+    Attributes:
+        labels: Class labels.
+        tokens: Numpy array with interned token strings, the column index of w_c.
+        w_c: CountMatrix (classes x tokens) with the number of times each token occurs in each class,
+            or, for the Bernoulli algorithm, the number of rows of each class, which contain the token.
+        d_c: Number of rows per class.
+        l_c: Number of tokens per class.
+        v: Number of distinct tokens in training data.
+        order: Classes in order of their first appearance in training data.
+        buckets: Number of buckets in the hashing mode, 0 if tokens are kept as they are.
+        algorithm: One of ALGORITHMS.
+        _tokens: Decoded tokens or None.
+        _token_blob: UTF-8 encoded tokens and offsets of every token in them or None.
+        _index: A dict token: column, built on the first lookup.
+    """
+
+    __slots__ = ('labels', '_tokens', '_token_blob', 'w_c', 'd_c', 'l_c', 'v', 'order', 'buckets', 'algorithm',
+                 '_index')
+
+    def __init__(self, labels, tokens, w_c, d_c, l_c, v, order, token_blob=None, buckets=0, algorithm='multinomial'):
+        """Inits the model instance. Tokens are a list of strings or a numpy array of interned strings,
+        which is kept as it is. They may be None, if token_blob (bytes, offsets) is given.
+        w_c is a CountMatrix or a dense matrix."""
+        self.labels = labels
+        if tokens is None or isinstance(tokens, numpy.ndarray):
+            self._tokens = tokens
+        else:
+            self._tokens = numpy.array([sys.intern(token) for token in tokens], dtype=object)
+        self._token_blob = token_blob
+        self.w_c = w_c if isinstance(w_c, CountMatrix) else CountMatrix.from_dense(w_c)
+        self.d_c = numpy.asarray(d_c, dtype=numpy.int64)
+        self.l_c = numpy.asarray(l_c, dtype=numpy.int64)
+        self.v = v
+        self.order = numpy.asarray(order, dtype=numpy.intp)
+        self.buckets = buckets
+        self.algorithm = algorithm
+        self._index = None
+
+    @staticmethod
+    def hash_tokens(tokens, buckets):
+        """Returns numbers of buckets of the tokens: 32-bit FNV-1a hash of UTF-8 bytes modulo buckets.
+        The hash does not depend on the process, so it can be computed by the FPGA too."""
+        encoded = numpy.array([token.encode('utf-8') for token in tokens], dtype=bytes)
+        if not len(encoded):
+            return numpy.zeros(0, dtype=numpy.int64)
+        lengths = numpy.char.str_len(encoded)
+        matrix = encoded.view(numpy.uint8).reshape(len(encoded), -1)
+        hashes = numpy.full(len(encoded), _FNV_OFFSET, dtype=numpy.uint32)
+        for i in range(matrix.shape[1]):
+            hashes = numpy.where(lengths > i, (hashes ^ matrix[:, i]) * numpy.uint32(_FNV_PRIME), hashes)
+        return hashes.astype(numpy.int64) % buckets
+
+    def freeze(self):
+        """Makes the arrays of the model read-only."""
+        w_c = self.w_c
+        for array in (w_c.indptr, w_c.indices, w_c.data, self.d_c, self.l_c, self.order, self._tokens):
+            if array is not None:
+                array.flags.writeable = False
+
+    @property
+    def tokens(self):
+        """Numpy array with interned token strings, the column index of w_c."""
+        if self._tokens is None:
+            tokens = numpy.array([sys.intern(self.get_token(i)) for i in range(self.w_c.shape[1])], dtype=object)
+            tokens.flags.writeable = False
+            self._tokens = tokens
+        return self._tokens
+
+    def get_token(self, column):
+        """Returns the token of the column of w_c."""
+        if self._tokens is not None:
+            return self._tokens[column]
+        blob, offsets = self._token_blob
+        return bytes(blob[offsets[column]:offsets[column + 1]]).decode('utf-8')
+
+    def get_index(self):
+        """Returns the dict token: column of w_c."""
+        if self._index is None:
+            self._index = {token: i for i, token in enumerate(self.tokens)}
+        return self._index
+
+    def get_nbytes(self):
+        """Returns the number of bytes of arrays and tokens of the model."""
+        nbytes = self.w_c.nbytes + sum(array.nbytes for array in (self.d_c, self.l_c, self.order))
+        if self._token_blob is not None:
+            nbytes += len(self._token_blob[0]) + self._token_blob[1].nbytes
+        if self._tokens is not None:
+            nbytes += self._tokens.nbytes + sum(sys.getsizeof(token) for token in self._tokens)
+        return nbytes
+
+    def to_dict(self):
+        """Returns the model in the dict form, used before ModelNBC.
+        Keys in model: 'v', 'd_c', 'l_c' (classes in order of sorted labels), 'w_c' (classes in order
+            of appearance, a dict token: count per class)."""
+        w_c = []
+        for row in self.order:
+            start, end = self.w_c.indptr[row], self.w_c.indptr[row + 1]
+            w_c.append(dict(zip(self.tokens[self.w_c.indices[start:end]].tolist(),
+                                self.w_c.data[start:end].tolist())))
+        return {'w_c': w_c, 'd_c': list(self.d_c), 'l_c': list(self.l_c), 'v': self.v}
+
+    def save(self, file_name):
+        """Writes the model to the binary file. The file is replaced at once, so mapped copies stay valid."""
+        if self._token_blob is None:
+            encoded = [token.encode('utf-8') for token in self._tokens]
+            blob = b''.join(encoded)
+            offsets = numpy.zeros(len(encoded) + 1, dtype='<i8')
+            numpy.cumsum([len(token) for token in encoded], out=offsets[1:])
+        else:
+            blob, offsets = self._token_blob
+        labels = json.dumps([label.item() if isinstance(label, numpy.generic) else label for label in self.labels])
+        count_dtype = self.w_c.data.dtype.newbyteorder('<')
+        sections = [labels.encode('utf-8'), blob, numpy.ascontiguousarray(offsets, dtype='<i8'),
+                    numpy.ascontiguousarray(self.d_c, dtype='<i8'), numpy.ascontiguousarray(self.l_c, dtype='<i8'),
+                    numpy.ascontiguousarray(self.order, dtype='<i8'),
+                    numpy.ascontiguousarray(self.w_c.indptr, dtype='<i8'),
+                    numpy.ascontiguousarray(self.w_c.indices, dtype=_int_dtype(self.w_c.shape[1]).newbyteorder('<')),
+                    numpy.ascontiguousarray(self.w_c.data, dtype=count_dtype)]
+
+        # Sections start at aligned offsets after the header and the table of sections
+        table = []
+        position = _MODEL_HEADERS[_MODEL_VERSION].size + _MODEL_SECTION.size * len(sections)
+        for section in sections:
+            position += -position % _MODEL_ALIGNMENT
+            size = len(section) if isinstance(section, bytes) else section.nbytes
+            table.append((position, size))
+            position += size
+
+        temporary = '%s.%d.tmp' % (file_name, os.getpid())
+        with open(temporary, 'wb') as file:
+            file.write(_MODEL_HEADERS[_MODEL_VERSION].pack(_MODEL_MAGIC, _MODEL_VERSION, len(self.labels),
+                                                           self.w_c.shape[1], self.v, self.buckets,
+                                                           ALGORITHMS.index(self.algorithm), count_dtype.itemsize))
+            for offset, size in table:
+                file.write(_MODEL_SECTION.pack(offset, size))
+            for (offset, _), section in zip(table, sections):
+                file.seek(offset)
+                file.write(section)
+        os.replace(temporary, file_name)
+
+    @classmethod
+    def load(cls, file_name):
+        """Returns the model from the binary file. Arrays are read-only views of the mapped file."""
+        raw = numpy.memmap(file_name, dtype=numpy.uint8, mode='r')
+        magic, version = _MODEL_PREFIX.unpack_from(raw)
+        if magic != _MODEL_MAGIC:
+            raise ValueError('%s is not a model file' % file_name)
+        if version not in _MODEL_HEADERS:
+            raise ValueError('Unsupported model file version %d' % version)
+        header = _MODEL_HEADERS[version]
+        n_classes, n_tokens, v, buckets, algorithm, count_bytes = (header.unpack_from(raw)[2:] + (0, 0, 8))[:6]
+        sections = {}
+        for i, name in enumerate(_MODEL_SECTIONS if version >= 4 else _MODEL_DENSE_SECTIONS):
+            offset, size = _MODEL_SECTION.unpack_from(raw, header.size + i * _MODEL_SECTION.size)
+            sections[name] = raw[offset:offset + size]
+        labels = json.loads(bytes(sections['labels']).decode('utf-8'))
+        offsets = sections['token_offsets'].view('<i8')
+        if version >= 4:
+            w_c = CountMatrix((n_classes, n_tokens), sections['w_c_indptr'].view('<i8'),
+                              sections['w_c_indices'].view(_int_dtype(n_tokens).newbyteorder('<')),
+                              sections['w_c_data'].view('<i%d' % count_bytes))
+        else:
+            w_c = sections['w_c'].view('<i8').reshape(n_classes, n_tokens)
+        return cls(labels, None, w_c, sections['d_c'].view('<i8'), sections['l_c'].view('<i8'), v,
+                   sections['order'].view('<i8'), (sections['token_blob'], offsets), buckets, ALGORITHMS[algorithm])
+
+
+""" S E C O N D A R Y   C L A S S:  #################################################################################"""
+
+
+class CountMatrix:
+    """A sparse matrix of counts in the compressed sparse row (CSR) form.
+
+    Only nonzero counts are kept. Columns and counts of row i are indices[indptr[i]:indptr[i + 1]]
+        and data[indptr[i]:indptr[i + 1]], columns of a row are ascending. Columns and counts are
+        kept as int32 if they fit in it, so a matrix of a big vocabulary takes a few bytes per nonzero count.
+
+    Attributes:
+        shape: Numbers of rows and columns.
+        indptr: Numpy array with the start of every row in indices and data and the number of counts at the end.
+        indices: Numpy array with the column of every count.
+        data: Numpy array with the counts.
+    """
+
+    __slots__ = ('shape', 'indptr', 'indices', 'data')
+
+    def __init__(self, shape, indptr, indices, data):
+        """Inits the matrix instance."""
+        self.shape = (int(shape[0]), int(shape[1]))
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @classmethod
+    def from_rows(cls, shape, rows, columns, counts):
+        """Returns the matrix of counts at (rows, columns), which are sorted by row and by column in every row.
+        Zero counts are left out."""
+        nonzero = counts != 0
+        rows, columns, counts = rows[nonzero], columns[nonzero], counts[nonzero]
+        indptr = numpy.zeros(shape[0] + 1, dtype=numpy.int64)
+        numpy.cumsum(numpy.bincount(rows, minlength=shape[0]), out=indptr[1:])
+        return cls(shape, indptr, columns.astype(_int_dtype(shape[1])),
+                   counts.astype(_int_dtype(counts.max(initial=0))))
+
+    @classmethod
+    def from_dense(cls, matrix):
+        """Returns the matrix of the dense matrix."""
+        matrix = numpy.asarray(matrix)
+        rows, columns = numpy.nonzero(matrix)
+        return cls.from_rows(matrix.shape, rows, columns, matrix[rows, columns])
+
+    @property
+    def nbytes(self):
+        """Number of bytes of the arrays."""
+        return self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+
+    def get_rows(self):
+        """Returns the row of every count."""
+        return numpy.repeat(numpy.arange(self.shape[0]), numpy.diff(self.indptr))
+
+    def get_row(self, row):
+        """Returns the row as a dense array."""
+        dense = numpy.zeros(self.shape[1], dtype=numpy.int64)
+        dense[self.indices[self.indptr[row]:self.indptr[row + 1]]] = self.data[self.indptr[row]:self.indptr[row + 1]]
+        return dense
+
+    def toarray(self):
+        """Returns the dense matrix."""
+        dense = numpy.zeros(self.shape, dtype=numpy.int64)
+        dense[self.get_rows(), self.indices] = self.data
+        return dense
+
+    def sum(self, axis):
+        """Returns sums of columns (axis 0) or rows (axis 1)."""
+        if axis == 0:
+            positions, size = self.indices, self.shape[1]
+        else:
+            positions, size = self.get_rows(), self.shape[0]
+        return numpy.bincount(positions, weights=self.data, minlength=size).astype(numpy.int64)
+
+    def take_columns(self, columns):
+        """Returns the matrix of the columns (ascending) only."""
+        new_column = numpy.full(self.shape[1], -1, dtype=numpy.int64)
+        new_column[columns] = numpy.arange(len(columns))
+        kept = new_column[self.indices] >= 0
+        return CountMatrix.from_rows((self.shape[0], len(columns)), self.get_rows()[kept],
+                                     new_column[self.indices[kept]], self.data[kept])
+
+
+class _ModelRegistry:
+    """The class of the registry of named NBC models.
+
+    Models are kept in memory in order of their last use. When the resident models take more bytes
+        than the budget, the least recently used ones are written to model files and dropped.
+        An evicted model is mapped from its file again, when it is used. A model is written only once,
+        models are frozen, so its file stays valid until the model is removed or replaced.
+        A temporary directory of model files is removed when the program exits.
+
+    Attributes:
+        _lock: A lock of the registry.
+        _max_bytes: The memory budget of resident models.
+        _directory: Directory of model files or None for a temporary directory created when needed.
+        _entries: OrderedDict name: [model or None, bytes, file name or None], the least recently used first.
+            Bytes of a mapped model are counted again when it is loaded, its tokens are not decoded then.
+        _resident_bytes: Bytes of resident models.
+        _serial: Number of the next model file.
+        _stats: A dict with hits, reloads and evictions.
+    """
+
+    def __init__(self, max_bytes):
+        """Inits the registry instance."""
+        self._lock = threading.Lock()
+        self._max_bytes = max_bytes
+        self._directory = None
+        self._entries = collections.OrderedDict()
+        self._resident_bytes = 0
+        self._serial = 0
+        self._stats = {'hits': 0, 'reloads': 0, 'evictions': 0}
+
+    def _evict(self, keep=None):
+        """Evicts the least recently used models except keep while the registry is over the budget."""
+        for name, entry in list(self._entries.items()):
+            if self._resident_bytes <= self._max_bytes:
+                break
+            if entry[0] is None or name == keep:
+                continue
+            if entry[2] is None:
+                if self._directory is None:
+                    self._directory = tempfile.mkdtemp(prefix='nbc_models_')
+                    atexit.register(shutil.rmtree, self._directory, True)
+                entry[2] = os.path.join(self._directory, '%d.nbcm' % self._serial)
+                self._serial += 1
+                entry[0].save(entry[2])
+            entry[0] = None
+            self._resident_bytes -= entry[1]
+            self._stats['evictions'] += 1
+
+    def _drop(self, name):
+        """Removes the entry and its file."""
+        model, nbytes, file_name = self._entries.pop(name)
+        if model is not None:
+            self._resident_bytes -= nbytes
+        if file_name is not None and os.path.exists(file_name):
+            os.remove(file_name)
+
+    def add(self, name, model):
+        """Adds the model under the name, a model with the same name is replaced."""
+        with self._lock:
+            if name in self._entries:
+                self._drop(name)
+            nbytes = model.get_nbytes()
+            self._entries[name] = [model, nbytes, None]
+            self._resident_bytes += nbytes
+            self._evict(name)
+
+    def get(self, name):
+        """Returns the model, maps it from its file if it was evicted."""
+        with self._lock:
+            entry = self._entries[name]
+            self._entries.move_to_end(name)
+            if entry[0] is None:
+                entry[0] = ModelNBC.load(entry[2])
+                entry[0].freeze()
+                entry[1] = entry[0].get_nbytes()
+                self._resident_bytes += entry[1]
+                self._stats['reloads'] += 1
+                self._evict(name)
+            else:
+                self._stats['hits'] += 1
+            return entry[0]
+
+    def remove(self, name):
+        """Removes the model. Raises KeyError if there is no such model."""
+        with self._lock:
+            self._drop(name)
+
+    def get_names(self):
+        """Returns names of the models, the least recently used first."""
+        with self._lock:
+            return list(self._entries)
+
+    def configure(self, max_bytes, directory):
+        """Sets the budget and the directory of model files, evicts models over the budget."""
+        with self._lock:
+            if max_bytes is not None:
+                self._max_bytes = max_bytes
+            if directory is not None:
+                os.makedirs(directory, exist_ok=True)
+                self._directory = directory
+            self._evict()
+
+    def get_stats(self):
+        """Returns a dict with stats of the registry."""
+        with self._lock:
+            return dict(self._stats, models=len(self._entries),
+                        resident=sum(entry[0] is not None for entry in self._entries.values()),
+                        resident_bytes=self._resident_bytes, max_bytes=self._max_bytes,
+                        spilled_bytes=sum(entry[1] for entry in self._entries.values() if entry[0] is None))
+
+
+""" F U N C T I O N S:  #############################################################################################"""
+
+
+def read_table(file, delimiter, n_columns, chunk_rows=None, engine='c'):
+    """Returns the table of the file (a name or a binary file object) or a reader of its chunks of chunk_rows rows.
+    Tokens are read as strings exactly as they are written, so every way of training and classifying the file
+    sees the same tokens. The label of a labeled file is column 0, it is read as a string too, so a chunk
+    or a shard gets the same labels as the whole file."""
+    return pandas.read_csv(file, sep=delimiter, header=None, names=range(n_columns), dtype=object,
+                           chunksize=chunk_rows, engine=engine)
+
+
+def tokenize(column):
+    """Returns integer codes of cells of the column (-1 for empty cells) and token strings of the codes.
+    Only unique values are turned into strings. Cells read by read_table are strings already, other values
+    (rows given as lists of numbers) are turned into strings by str."""
+    codes, uniques = pandas.factorize(column)
+    if pandas.api.types.infer_dtype(uniques, skipna=False) != 'string':
+        uniques = [str(unique) for unique in uniques]
+    return codes, numpy.asarray(uniques, dtype=object)
+
+
+def _int_dtype(largest):
+    """Returns int32 if the number fits in it, int64 otherwise."""
+    return numpy.dtype(numpy.int32 if largest <= numpy.iinfo(numpy.int32).max else numpy.int64)
 
 
 """ E N D   O F   F I L E.  #########################################################################################"""
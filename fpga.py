@@ -0,0 +1,381 @@
+""" I M P O R T:  ###################################################################################################"""
+
+
+import core
+import csv
+import data
+import json
+import numpy
+import os
+import pandas
+import time
+
+
+""" G E T   I N T E R F A C E   I N S T A N C E:  ###################################################################"""
+
+
+def get_interface(interface_core):
+    """Returns the FPGA interface instance."""
+    return InterfaceFPGA(interface_core)
+
+
+""" I N T E R F A C E:  #############################################################################################"""
+
+
+class InterfaceFPGA:
+    """The interface of the FPGA module.
+
+    This class contains methods for exporting the trained model to
+        fixed-point memory images and for emulating the FPGA datapath.
+
+    Attributes:
+        _main_module_object: An instance of the main class.
+        _interface_core: An instance of the core interface.
+        _interface_predict: An instance of the predict interface.
+        _interface_data: An instance of the data interface.
+        _version: Version of the NBC model, which the main class was quantized for.
+        _format: Arguments of the last nbc_quantize (width, frac_bits, acc_width).
+    """
+
+    def __init__(self, interface_core: core.InterfaceCore):
+        """Inits the interface instance."""
+        self._main_module_object = None
+        self._interface_core = interface_core
+        self._interface_predict = interface_core.get_interface_by_name('predict')
+        self._interface_data = interface_core.get_interface_data()
+        self._version = None
+        self._format = (16, None, 32)
+
+    def _get_fixed_point(self):
+        """Returns the main class instance for the current NBC model. A new model is quantized
+        with the format of the last nbc_quantize."""
+
+        #####################################
+        # CALLING METHOD FROM OTHER MODULE! #
+        if self._main_module_object is None or self._interface_data.get_model_nbc_version() != self._version:
+            self.nbc_quantize(*self._format)
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+        #####################################
+
+        return self._main_module_object
+
+    def nbc_prune(self, min_count: int = 0, top_k: int = 0, features: int = 0, max_bytes: int = None,
+                  width: int = 16):
+        """Removes tokens from the current NBC model and publishes the smaller model, which is exported after.
+        Tokens are kept if they occur at least min_count times, if they are among the top_k tokens of any class
+            (0 keeps all) and among the features tokens with the largest mutual information with the class
+            (0 keeps all). If max_bytes is set, the tokens with the largest mutual information are kept,
+            so that the table of width bit values fits in max_bytes. Removed tokens are scored as unseen tokens.
+        Returns a dict with the number of kept tokens and the bytes of the table before and after."""
+
+        #####################################
+        # CALLING METHOD FROM OTHER MODULE! #
+        model = self._interface_data.get_model_nbc()
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+        #####################################
+
+        pruned = _prune(model, min_count, top_k, features, max_bytes, width)
+
+        #####################################
+        # CALLING METHOD FROM OTHER MODULE! #
+        self._interface_data.set_ready_model_nbc(pruned)
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+        #####################################
+
+        return {'tokens': len(pruned.tokens), 'bytes': _table_bytes(pruned, width),
+                'tokens_before': len(model.tokens), 'bytes_before': _table_bytes(model, width)}
+
+    def nbc_prune_report(self, file_name: str, delimiter: str, settings, width: int = 16):
+        """Prunes the current NBC model with every setting (a dict of arguments of nbc_prune) without publishing it
+        and classifies the labeled held-out file with it. Returns a list of dicts with the setting, kept tokens,
+        bytes of the table of width bit values and accuracy of the float model, the unpruned model first."""
+
+        #####################################
+        # CALLING METHOD FROM OTHER MODULE! #
+        model = self._interface_data.get_model_nbc()
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+        #####################################
+
+        n_columns = pandas.read_csv(file_name, sep=delimiter, header=None, nrows=1).shape[1]
+        frame = data.read_table(file_name, delimiter, n_columns)
+        report = []
+        for setting in [{}] + list(settings):
+            pruned = _prune(model, width=width, **setting) if setting else model
+
+            #####################################
+            # CALLING METHOD FROM OTHER MODULE! #
+            accuracy, = self._interface_predict.nbc_evaluate_model(pruned, frame.iloc[:, 1:], frame[0].to_numpy())
+            # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+            #####################################
+
+            report.append({'setting': setting, 'tokens': len(pruned.tokens), 'bytes': _table_bytes(pruned, width),
+                           'accuracy': accuracy})
+        return report
+
+    def nbc_quantize(self, width: int = 16, frac_bits: int = None, acc_width: int = 32):
+        """Converts the current NBC model to signed fixed-point tables of width bits.
+        If frac_bits is None, it is chosen so that the largest magnitude of the prior and the table fits.
+        acc_width is the width of the saturating accumulator of the datapath.
+        Export and emulation quantize a newer model again with the same arguments."""
+
+        #####################################
+        # CALLING METHOD FROM OTHER MODULE! #
+        # The version is taken first, so a model published meanwhile is quantized again later
+        version = self._interface_data.get_model_nbc_version()
+        self._interface_predict.nbc_prepare()
+        labels, vocabulary, log_prior, log_likelihood = self._interface_predict.nbc_get_tables()
+        buckets = self._interface_predict.nbc_get_buckets()
+        algorithm = self._interface_predict.nbc_get_algorithm()
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+        #####################################
+
+        self._main_module_object = _FixedPointNBC(self._interface_core, labels, vocabulary, log_prior, log_likelihood,
+                                                  width, frac_bits, acc_width, buckets, algorithm)
+        self._version = version
+        self._format = (width, frac_bits, acc_width)
+
+    def nbc_export(self, directory: str):
+        """Writes memory images (.mem, .coe, .bin), the token map and the header to the directory.
+        Returns names of the written files, they are published to the 'fpga.exported' topic too."""
+        files = self._get_fixed_point().export(directory)
+        self._interface_core.publish('fpga.exported', files)
+        return files
+
+    def nbc_emulate(self, file_name: str, delimiter: str):
+        """Classifies the labeled file with the bit-exact integer datapath and with the float model.
+        Returns a dict with accuracies, their agreement, saturations of the accumulator and of the tables
+        during quantization and throughput."""
+        fixed_point = self._get_fixed_point()
+
+        #####################################
+        # CALLING METHOD FROM OTHER MODULE! #
+        chunks = self._interface_predict.nbc_encode_file(file_name, delimiter, True)
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+        #####################################
+
+        return fixed_point.emulate(chunks)
+
+
+""" C O N S T A N T S:  #############################################################################################"""
+
+
+# Prefix of names of the exported files.
+_FILE_PREFIX = 'nbc'
+
+
+""" M A I N   C L A S S:  ###########################################################################################"""
+
+
+class _FixedPointNBC:
+    """The main class of the FPGA module.
+
+    This class holds the NBC model as signed fixed-point tables. One word of the memory
+        holds the values of all classes for one token, class 0 in the least significant bits.
+        Address of a token is its row in the table, the last address is for unseen tokens.
+        The datapath adds the prior and the word of every token of a row to an accumulator
+        of acc_width bits, which saturates after each addition. The class with the largest
+        sum wins, the smallest class number on ties. In the hashing mode address of a token
+        is its 32-bit FNV-1a hash modulo the number of buckets, so the token map is not needed.
+        For the Bernoulli algorithm repeated tokens of a row must be added once.
+
+    Attributes:
+        _interface_core: An instance of the core interface.
+        _labels: Numpy array with class labels.
+        _vocabulary: A pandas Index of the model tokens.
+        _width, _frac_bits, _acc_width: Fixed-point format of tables and accumulator.
+        _buckets: Number of buckets in the hashing mode or 0.
+        _algorithm: The algorithm of the model.
+        _log_prior, _log_likelihood: Float tables of the model.
+        _prior: Fixed-point log-prior per class.
+        _table: Fixed-point log-likelihood table (tokens + 2, classes), rows as in the predict module.
+        _quantization_saturations: Number of values of _prior and _table saturated to the range of width bits.
+    """
+
+    def __init__(self, interface_core, labels, vocabulary, log_prior, log_likelihood, width, frac_bits, acc_width,
+                 buckets=0, algorithm='multinomial'):
+        """Inits the fixed-point model instance."""
+        self._interface_core = interface_core
+        self._labels = labels
+        self._vocabulary = vocabulary
+        self._log_prior = log_prior
+        self._log_likelihood = log_likelihood
+        self._width = width
+        self._acc_width = acc_width
+        self._buckets = buckets
+        self._algorithm = algorithm
+        if frac_bits is None:
+            # Complement tables and Bernoulli log-odds are positive too, so the largest magnitude must fit
+            largest = max(-log_prior.min(initial=0), log_prior.max(initial=0),
+                          -log_likelihood.min(initial=0), log_likelihood.max(initial=0))
+            frac_bits = width - 1 - int(numpy.ceil(numpy.log2(1 + largest)))
+        self._frac_bits = frac_bits
+        self._quantization_saturations = 0
+        self._prior = self._quantize(log_prior)
+        self._table = self._quantize(log_likelihood)
+
+    def _quantize(self, values):
+        """Returns values rounded to the fixed-point format, saturated to its range. Saturated values are counted."""
+        low, high = -(1 << (self._width - 1)), (1 << (self._width - 1)) - 1
+        scaled = numpy.floor(values * 2.0 ** self._frac_bits + 0.5)
+        self._quantization_saturations += int(numpy.count_nonzero((scaled < low) | (scaled > high)))
+        return numpy.clip(scaled, low, high).astype(numpy.int64)
+
+    def _words(self, table):
+        """Returns hex strings of memory words, one per row of the table."""
+        digits = (table.shape[1] * self._width + 3) // 4
+        unsigned = table & ((1 << self._width) - 1)
+        if self._width in (8, 16, 32):
+            # Big-endian bytes of the reversed row are the hex digits of the word
+            dtype = numpy.dtype('>u%d' % (self._width // 8))
+            text = numpy.ascontiguousarray(unsigned[:, ::-1]).astype(dtype).tobytes().hex()
+            return [text[i:i + digits] for i in range(0, len(text), digits)]
+        words = []
+        for row in unsigned.tolist():
+            word = 0
+            for value in reversed(row):
+                word = (word << self._width) | value
+            words.append('%0*x' % (digits, word))
+        return words
+
+    def export(self, directory):
+        """Writes the files to the directory, returns their names."""
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, _FILE_PREFIX)
+        table = self._table[:-1]
+        words = self._words(table)
+
+        with open(path + '_lut.mem', 'w') as file:
+            file.write('\n'.join(words) + '\n')
+        with open(path + '_lut.coe', 'w') as file:
+            file.write('memory_initialization_radix=16;\nmemory_initialization_vector=\n')
+            file.write(',\n'.join(words) + ';\n')
+        with open(path + '_prior.mem', 'w') as file:
+            file.write(self._words(self._prior[numpy.newaxis])[0] + '\n')
+        container = numpy.dtype('<i%d' % next(size for size in (1, 2, 4, 8) if self._width <= 8 * size))
+        with open(path + '_lut.bin', 'wb') as file:
+            file.write(numpy.ascontiguousarray(table, dtype=container).tobytes())
+        with open(path + '_tokens.csv', 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(['address', 'token'])
+            writer.writerows(enumerate(self._vocabulary))
+        with open(path + '_header.json', 'w') as file:
+            json.dump({'width': self._width, 'frac_bits': self._frac_bits, 'acc_width': self._acc_width,
+                       'classes': len(self._labels), 'labels': [str(label) for label in self._labels],
+                       'depth': len(table), 'unseen_address': len(table) - 1, 'bin_dtype': container.str,
+                       'prior': self._prior.tolist(), 'buckets': self._buckets,
+                       'hash': 'fnv1a32' if self._buckets else None, 'algorithm': self._algorithm,
+                       'unique_tokens': data.ALGORITHM_REGISTRY[self._algorithm][1] == 'df_c'}, file, indent=4)
+        return [path + suffix for suffix in ('_lut.mem', '_lut.coe', '_prior.mem', '_lut.bin', '_tokens.csv',
+                                             '_header.json')]
+
+    def _accumulate(self, codes):
+        """Returns sums of the integer datapath (rows x classes) and the number of saturations."""
+        low, high = -(1 << (self._acc_width - 1)), (1 << (self._acc_width - 1)) - 1
+        sums = numpy.repeat(self._prior[numpy.newaxis], len(codes), axis=0)
+        saturations = 0
+        for column in codes.T:
+            sums += self._table[column]
+            saturated = (sums < low) | (sums > high)
+            if saturated.any():
+                saturations += int(numpy.count_nonzero(saturated))
+                numpy.clip(sums, low, high, out=sums)
+        return sums, saturations
+
+    def _float_scores(self, codes):
+        """Returns log-scores of the float model (rows x classes)."""
+        scores = numpy.repeat(self._log_prior[numpy.newaxis], len(codes), axis=0)
+        for column in codes.T:
+            scores += self._log_likelihood[column]
+        return scores
+
+    def emulate(self, chunks):
+        """Returns the report of emulation of the encoded chunks (labels, codes)."""
+        rows, fixed_correct, float_correct, agreement, saturations, seconds = 0, 0, 0, 0, 0, 0.0
+        profiler = self._interface_core.get_profiler()
+        for true_labels, codes in chunks:
+            start = time.perf_counter()
+            with profiler.span('fpga.accumulate') as span:
+                sums, chunk_saturations = self._accumulate(codes)
+                fixed_labels = self._labels[sums.argmax(axis=1)]
+                span.add_rows(len(codes))
+            seconds += time.perf_counter() - start
+            float_labels = self._labels[self._float_scores(codes).argmax(axis=1)]
+            rows += len(codes)
+            fixed_correct += int(numpy.count_nonzero(fixed_labels == true_labels))
+            float_correct += int(numpy.count_nonzero(float_labels == true_labels))
+            agreement += int(numpy.count_nonzero(fixed_labels == float_labels))
+            saturations += chunk_saturations
+        return {'rows': rows,
+                'accuracy_fixed': fixed_correct / rows if rows else 0.0,
+                'accuracy_float': float_correct / rows if rows else 0.0,
+                'agreement': agreement / rows if rows else 0.0,
+                'saturations': saturations,
+                'quantization_saturations': self._quantization_saturations,
+                'rows_per_second': rows / seconds if seconds else 0.0}
+
+
+""" F U N C T I O N S:  #############################################################################################"""
+
+
+def _table_bytes(model, width):
+    """Returns bytes of the exported table of the model: a word of width bits per class for every token
+    and the word of unseen tokens."""
+    return (len(model.tokens) + 1) * len(model.labels) * width // 8
+
+
+def _mutual_information(w_c):
+    """Returns mutual information between the class and the occurrence of every token (the columns of w_c,
+    a data.CountMatrix), over all token occurrences of the model: sum over classes c and u in (token, another token)
+    of p(u, c) * log(p(u, c) / (p(u) * p(c))). Only nonzero counts are visited: a class without the token adds
+    p(c) * log(1 / p(another token)), so these terms of all classes are summed first and replaced for the others."""
+    rows, columns = w_c.get_rows(), w_c.indices
+    l_c = w_c.sum(axis=1).astype(numpy.float64)
+    total = l_c.sum()
+    if not total:
+        return numpy.zeros(w_c.shape[1])
+    p_c = (l_c / total)[rows]
+    marginal = w_c.sum(axis=0) / total
+    joint = w_c.data / total
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        absent = numpy.where(marginal < 1, -numpy.log1p(-marginal), 0)
+        rest = p_c - joint
+        terms = (joint * numpy.log(joint / (marginal[columns] * p_c))
+                 + numpy.where(rest > 0, rest * numpy.log(rest / ((1 - marginal[columns]) * p_c)), 0)
+                 - p_c * absent[columns])
+    return numpy.nan_to_num(absent + numpy.bincount(columns, weights=terms, minlength=w_c.shape[1]))
+
+
+def _prune(model, min_count=0, top_k=0, features=0, max_bytes=None, width=16):
+    """Returns the model without pruned tokens, see InterfaceFPGA.nbc_prune. Kept tokens stay in their order,
+    l_c and v are not changed, so kept tokens have the same log-likelihood as in the model."""
+    if model.buckets:
+        raise ValueError('The table of a model trained in the hashing mode has a row for every bucket, '
+                         'it cannot be pruned')
+    w_c = model.w_c
+    keep = w_c.sum(axis=0) >= min_count
+    if top_k and top_k < w_c.shape[1]:
+        # Top tokens of a class are taken from its kept tokens with nonzero counts
+        top = numpy.zeros_like(keep)
+        for row in range(w_c.shape[0]):
+            columns = w_c.indices[w_c.indptr[row]:w_c.indptr[row + 1]]
+            counts = w_c.data[w_c.indptr[row]:w_c.indptr[row + 1]]
+            columns, counts = columns[keep[columns]], counts[keep[columns]]
+            if len(columns) > top_k:
+                columns = columns[numpy.argpartition(-counts, top_k - 1)[:top_k]]
+            top[columns] = True
+        keep &= top
+    if features or max_bytes is not None:
+        information = numpy.where(keep, _mutual_information(w_c), -numpy.inf)
+        limit = numpy.count_nonzero(keep)
+        if features:
+            limit = min(limit, features)
+        if max_bytes is not None:
+            limit = min(limit, max(max_bytes * 8 // (len(model.labels) * width) - 1, 0))
+        keep = numpy.zeros_like(keep)
+        keep[numpy.argsort(-information, kind='stable')[:limit]] = True
+    columns = numpy.flatnonzero(keep)
+    return data.ModelNBC(model.labels, model.tokens[columns], w_c.take_columns(columns), model.d_c, model.l_c, model.v,
+                         model.order, buckets=model.buckets, algorithm=model.algorithm)
+
+
+""" E N D   O F   F I L E.  #########################################################################################"""
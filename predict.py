@@ -0,0 +1,312 @@
+""" I M P O R T:  ###################################################################################################"""
+
+
+import core
+import data
+import numpy
+import pandas
+
+
+""" G E T   I N T E R F A C E   I N S T A N C E:  ###################################################################"""
+
+
+def get_interface(interface_core):
+    """Returns the Predict interface instance."""
+    return InterfacePredict(interface_core)
+
+
+""" I N T E R F A C E:  #############################################################################################"""
+
+
+class InterfacePredict:
+    """The interface of the Predict module.
+
+    This class contains methods for classifying data with the trained model.
+
+    Attributes:
+        _main_module_object: An instance of the main class.
+        _interface_core: An instance of the core interface.
+        _interface_data: An instance of the data interface.
+        _version: Version of the NBC model, which the main class was prepared for.
+        _alpha: The additive (Laplace) smoothing constant.
+    """
+
+    def __init__(self, interface_core: core.InterfaceCore):
+        """Inits the interface instance."""
+        self._main_module_object = None
+        self._interface_core = interface_core
+        self._interface_data = interface_core.get_interface_data()
+        self._version = None
+        self._alpha = 1.0
+
+    def nbc_set_alpha(self, alpha: float):
+        """Sets the additive smoothing constant, 1 is the Laplace smoothing used by default."""
+        self._alpha = alpha
+        self._version = None
+
+    def nbc_prepare(self):
+        """Precomputes scoring tables for the current NBC model in the data module.
+        Other methods call it themselves when a new model is published."""
+
+        #####################################
+        # CALLING METHOD FROM OTHER MODULE! #
+        version, model = self._interface_data.get_model_nbc_snapshot()
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+        #####################################
+
+        with self._interface_core.get_profiler().span('predict.prepare'):
+            self._main_module_object = _Predictor(self._interface_core, model, self._alpha)
+            self._version = version
+
+    def _get_predictor(self):
+        """Returns the main class instance for the current NBC model."""
+
+        #####################################
+        # CALLING METHOD FROM OTHER MODULE! #
+        if self._interface_data.get_model_nbc_version() != self._version:
+            self.nbc_prepare()
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+        #####################################
+
+        return self._main_module_object
+
+    def nbc_predict(self, rows):
+        """Classifies rows of tokens (a list of lists or a DataFrame without labels).
+        Returns labels and log-scores (rows x classes, classes in order of ModelNBC.labels)."""
+        return self._get_predictor().predict_frame(pandas.DataFrame(rows))
+
+    def nbc_predict_file(self, file_name: str, delimiter: str, labeled: bool = False):
+        """Classifies rows of the file, column 0 is skipped if the file is labeled.
+        Returns labels and log-scores as nbc_predict."""
+        return self._get_predictor().predict_file(file_name, delimiter, labeled)
+
+    def nbc_evaluate(self, file_name: str, delimiter: str):
+        """Returns the share of rows in the labeled file, which are classified correctly."""
+        return self._get_predictor().evaluate(file_name, delimiter)
+
+    def nbc_get_tables(self):
+        """Returns class labels, tokens, log-prior per class and the log-likelihood table (tokens + 2, classes).
+        Row -2 of the table is for unseen tokens, row -1 is zero and it is used for empty cells."""
+        return self._get_predictor().get_tables()
+
+    def nbc_get_buckets(self):
+        """Returns the number of buckets of the model trained in the hashing mode, 0 if tokens are kept.
+        In the hashing mode the row of a token in the log-likelihood table is its bucket."""
+        return self._get_predictor().get_buckets()
+
+    def nbc_get_algorithm(self):
+        """Returns the algorithm of the model, see data.ALGORITHMS. Rows of a 'bernoulli' model are encoded with
+        every token once, repeated tokens of a row are encoded as empty cells."""
+        return self._get_predictor().get_algorithm()
+
+    def nbc_evaluate_model(self, model, frame, labels, alphas=(1.0,)):
+        """Returns shares of correctly classified rows of the table (a DataFrame without labels) with true labels
+        for every smoothing constant. The model (data.ModelNBC) is not published, rows are encoded once."""
+        return _Predictor(self._interface_core, model).evaluate_frame(frame, numpy.asarray(labels), alphas)
+
+    def nbc_encode_file(self, file_name: str, delimiter: str, labeled: bool = False):
+        """Yields chunks of the file (labels or None, rows with tokens replaced by rows of the log-likelihood table)."""
+        return self._get_predictor().encode_file(file_name, delimiter, labeled)
+
+
+""" C O N S T A N T S:  #############################################################################################"""
+
+
+# Rows in a chunk of a file, which is classified at once.
+_CHUNK_ROWS = 1 << 16
+
+# Upper limit of the number of table cells gathered at once.
+_GATHER_CELLS = 1 << 24
+
+
+""" M A I N   C L A S S:  ###########################################################################################"""
+
+
+class _Predictor:
+    """The main class of the Predict module.
+
+    This class turns the NBC model into tables of logarithms, so that a batch of rows
+        is classified by gathering rows of the table and summing them with numpy.
+        Score of class c: log(d_c/d) + sum(log((w_c+alpha)/(alpha*v+l_c))) over tokens of the row
+        for the multinomial model, other algorithms have other tables, see _TABLES.
+        In the hashing mode the table has a row for every bucket, so tokens are encoded by their hash.
+
+    Attributes:
+        _interface_core: An instance of the core interface.
+        _labels: Numpy array with class labels.
+        _vocabulary: A pandas Index of the model tokens, numbers of buckets in the hashing mode.
+        _buckets: Number of buckets in the hashing mode or 0.
+        _hash_tokens: The function, which returns buckets of tokens.
+        _algorithm: The algorithm of the model.
+        _log_prior: Score of a row without tokens per class, log(d_c/d) for the multinomial model.
+        _rows, _columns, _counts: Nonzero counts of w_c of the model with their classes and rows of _log_likelihood.
+        _d_c, _l_c, _v: Numbers of rows and tokens per class and distinct tokens of the model.
+        _log_likelihood: Table (tokens + 2, classes) with log((w_c+alpha)/(alpha*v+l_c)). Row -2 is for
+            unseen tokens, log(alpha/(alpha*v+l_c)). Row -1 is zero, it is used for empty cells.
+    """
+
+    def __init__(self, interface_core, model, alpha=1.0):
+        """Inits the predictor instance."""
+        self._interface_core = interface_core
+        self._labels = numpy.asarray(model.labels, dtype=object)
+        self._buckets = model.buckets
+        self._hash_tokens = model.hash_tokens
+        self._rows, self._columns, self._counts = model.w_c.get_rows(), model.w_c.indices, model.w_c.data
+        if self._buckets:
+            self._vocabulary = pandas.RangeIndex(self._buckets)
+            self._columns = model.tokens.astype(numpy.int64)[self._columns]
+        else:
+            self._vocabulary = pandas.Index(model.tokens)
+        self._algorithm = model.algorithm
+        self._d_c, self._l_c, self._v = model.d_c, model.l_c, model.v
+        self._log_prior = None
+        self._log_likelihood = numpy.empty((len(self._vocabulary) + 2, len(model.labels)))
+        self._set_alpha(alpha)
+
+    def _set_alpha(self, alpha):
+        """Computes _log_prior and _log_likelihood with the smoothing constant."""
+        self._log_prior = _TABLES[self._algorithm](self._rows, self._columns, self._counts, self._d_c, self._l_c,
+                                                   self._v, alpha, self._log_likelihood[:-1])
+        self._log_likelihood[-1] = 0
+
+    def _encode(self, frame):
+        """Returns rows of the table with tokens replaced by row numbers of _log_likelihood."""
+        with self._interface_core.get_profiler().span('predict.encode') as span:
+            unseen, empty = len(self._vocabulary), len(self._vocabulary) + 1
+            codes = numpy.empty(frame.shape, dtype=numpy.intp)
+            for i, col in enumerate(frame.columns):
+                column_codes, uniques = data.tokenize(frame[col])
+                if self._buckets:
+                    positions = self._hash_tokens(uniques, self._buckets)
+                else:
+                    positions = self._vocabulary.get_indexer(pandas.Index(uniques, dtype=object))
+                    positions = numpy.where(positions < 0, unseen, positions)
+                positions = numpy.append(positions, empty)
+                codes[:, i] = positions[column_codes]
+            if data.ALGORITHM_REGISTRY[self._algorithm][1] == 'df_c':
+                # A token is scored once per row: repeats in the sorted row become empty cells
+                codes.sort(axis=1)
+                codes[:, 1:][codes[:, 1:] == codes[:, :-1]] = empty
+            span.add_rows(len(frame))
+        return codes
+
+    def _score(self, codes):
+        """Returns log-scores (rows x classes) of the encoded rows."""
+        with self._interface_core.get_profiler().span('predict.score') as span:
+            scores = numpy.empty((len(codes), len(self._labels)))
+            step = max(_GATHER_CELLS // max(codes.shape[1] * len(self._labels), 1), 1)
+            for start in range(0, len(codes), step):
+                scores[start:start + step] = self._log_likelihood[codes[start:start + step]].sum(axis=1)
+            scores += self._log_prior
+            span.add_rows(len(codes))
+        return scores
+
+    def predict_frame(self, frame):
+        """Returns labels and log-scores of rows of the table."""
+        scores = self._score(self._encode(frame))
+        return self._labels[scores.argmax(axis=1)], scores
+
+    def get_tables(self):
+        """Returns class labels, tokens, log-prior and log-likelihood table."""
+        return self._labels, self._vocabulary, self._log_prior, self._log_likelihood
+
+    def get_buckets(self):
+        """Returns the number of buckets or 0."""
+        return self._buckets
+
+    def get_algorithm(self):
+        """Returns the algorithm of the model."""
+        return self._algorithm
+
+    def evaluate_frame(self, frame, labels, alphas):
+        """Returns shares of correctly classified rows of the table for every smoothing constant."""
+        codes = self._encode(frame)
+        accuracies = []
+        for alpha in alphas:
+            self._set_alpha(alpha)
+            predicted = self._labels[self._score(codes).argmax(axis=1)]
+            accuracies.append(int(numpy.count_nonzero(predicted == labels)) / len(labels) if len(labels) else 0.0)
+        return accuracies
+
+    def encode_file(self, file_name, delimiter, labeled):
+        """Yields chunks of the file (labels or None, encoded rows)."""
+        n_columns = pandas.read_csv(file_name, sep=delimiter, header=None, nrows=1).shape[1]
+        first = 1 if labeled else 0
+        with data.read_table(file_name, delimiter, n_columns, _CHUNK_ROWS) as reader:
+            for chunk in reader:
+                yield (chunk[0].to_numpy() if labeled else None), self._encode(chunk.iloc[:, first:])
+
+    def predict_file(self, file_name, delimiter, labeled):
+        """Returns labels and log-scores of rows of the file."""
+        scores = [self._score(codes) for _, codes in self.encode_file(file_name, delimiter, labeled)]
+        if not scores:
+            return numpy.empty(0, dtype=object), numpy.empty((0, len(self._labels)))
+        scores = numpy.concatenate(scores)
+        return self._labels[scores.argmax(axis=1)], scores
+
+    def evaluate(self, file_name, delimiter):
+        """Returns the share of correctly classified rows of the labeled file."""
+        correct, total = 0, 0
+        for true_labels, codes in self.encode_file(file_name, delimiter, True):
+            labels = self._labels[self._score(codes).argmax(axis=1)]
+            correct += int(numpy.count_nonzero(labels == true_labels))
+            total += len(labels)
+        return correct / total if total else 0.0
+
+
+""" F U N C T I O N S:  #############################################################################################"""
+
+
+def nbc_predict(model, rows):
+    """Classifies rows of tokens with the model (data.ModelNBC), returns labels and log-scores as
+    InterfacePredict.nbc_predict. An entry point of process pools of the message bus, it keeps no state."""
+    return _Predictor(core.InterfaceCore(core.MODULES_HEADLESS, headless=True), model).predict_frame(
+        pandas.DataFrame(rows))
+
+
+def nbc_evaluate(model, file_name, delimiter):
+    """Returns the share of rows in the labeled file, which the model (data.ModelNBC) classifies correctly.
+    An entry point of process pools of the message bus, it keeps no state."""
+    return _Predictor(core.InterfaceCore(core.MODULES_HEADLESS, headless=True), model).evaluate(file_name, delimiter)
+
+
+def _multinomial_tables(rows, columns, counts, d_c, l_c, v, alpha, table):
+    """Fills rows of tokens and the unseen row of the table from nonzero counts w_c[rows, columns],
+    returns the log-prior. A token adds log((w_c+alpha)/(alpha*v+l_c)) for every occurrence."""
+    denominator = alpha * v + l_c
+    table[:] = numpy.log(alpha / denominator)
+    table[columns, rows] = numpy.log((counts + alpha) / denominator[rows])
+    return numpy.log(d_c / d_c.sum())
+
+
+def _bernoulli_tables(rows, columns, counts, d_c, l_c, v, alpha, table):
+    """Fills the table of the Bernoulli model, w_c are numbers of rows of the class containing the token.
+    With p = (w_c+alpha)/(d_c+2*alpha), the score is log(d_c/d) + sum(log(1-p)) over the vocabulary plus
+    log(p/(1-p)) for every token of the row, so unseen tokens add nothing."""
+    p_zero = alpha / (d_c + 2 * alpha)
+    p = (counts + alpha) / (d_c[rows] + 2 * alpha)
+    table[:-1] = numpy.log(p_zero) - numpy.log1p(-p_zero)
+    table[columns, rows] = numpy.log(p) - numpy.log1p(-p)
+    table[-1] = 0
+    # Tokens without counts in the class have p_zero, the others correct their share of the sum
+    correction = numpy.bincount(rows, weights=numpy.log1p(-p) - numpy.log1p(-p_zero[rows]), minlength=len(d_c))
+    return numpy.log(d_c / d_c.sum()) + (len(table) - 1) * numpy.log1p(-p_zero) + correction
+
+
+def _complement_tables(rows, columns, counts, d_c, l_c, v, alpha, table):
+    """Fills the table of the Complement model: a token adds -log((n+alpha)/(alpha*v+m)), where n is the number
+    of its occurrences and m of all occurrences in other classes than c. The prior is not used."""
+    totals = numpy.bincount(columns, weights=counts, minlength=len(table) - 1)
+    denominator = alpha * v + (l_c.sum() - l_c)
+    table[:-1] = -numpy.log((totals[:, numpy.newaxis] + alpha) / denominator)
+    table[columns, rows] = -numpy.log((totals[columns] - counts + alpha) / denominator[rows])
+    table[-1] = -numpy.log(alpha / denominator)
+    return numpy.zeros(len(d_c))
+
+
+# Functions, which fill rows of tokens and the unseen row of the table and return the log-prior, by algorithm
+# of data.ALGORITHM_REGISTRY. The function of an algorithm is named _<algorithm>_tables.
+_TABLES = {algorithm: globals()['_%s_tables' % algorithm] for algorithm in data.ALGORITHMS}
+
+
+""" E N D   O F   F I L E.  #########################################################################################"""
@@ -0,0 +1,341 @@
+""" I M P O R T:  ###################################################################################################"""
+
+
+import argparse
+import asyncio
+import collections
+import core
+import json
+import numpy
+import threading
+import time
+
+
+""" G E T   I N T E R F A C E   I N S T A N C E:  ###################################################################"""
+
+
+def get_interface(interface_core):
+    """Returns the Serve interface instance."""
+    return InterfaceServe(interface_core)
+
+
+""" I N T E R F A C E:  #############################################################################################"""
+
+
+class InterfaceServe:
+    """The interface of the Serve module.
+
+    This class contains methods for classifying rows sent over HTTP on localhost
+        with the current model of the data module.
+
+    Attributes:
+        _main_module_object: An instance of the main class.
+        _interface_core: An instance of the core interface.
+    """
+
+    def __init__(self, interface_core: core.InterfaceCore):
+        """Inits the interface instance."""
+        self._main_module_object = None
+        self._interface_core = interface_core
+
+    def nbc_serve(self, host: str = '127.0.0.1', port: int = 8765, max_batch_rows: int = 4096,
+                  max_delay: float = 0.005):
+        """Runs the server until it is interrupted.
+        Concurrent requests are scored together, a batch waits for more rows at most max_delay seconds."""
+        self._main_module_object = _Server(self._interface_core, host, port, max_batch_rows, max_delay)
+        self._main_module_object.run()
+
+    def nbc_start_server(self, host: str = '127.0.0.1', port: int = 0, max_batch_rows: int = 4096,
+                         max_delay: float = 0.005):
+        """Starts the server in a background thread and returns its port. Port 0 takes any free port."""
+        self.nbc_stop_server()
+        self._main_module_object = _Server(self._interface_core, host, port, max_batch_rows, max_delay)
+        return self._main_module_object.start()
+
+    def nbc_stop_server(self):
+        """Stops the server started by nbc_start_server."""
+        if self._main_module_object is not None:
+            self._main_module_object.stop()
+
+    def nbc_get_server_stats(self):
+        """Returns a dict with counters of requests, rows and batches, p50/p99 latency and throughput."""
+        return None if self._main_module_object is None else self._main_module_object.get_stats()
+
+
+""" C O N S T A N T S:  #############################################################################################"""
+
+
+# Number of the last requests, which latency percentiles are computed over.
+_LATENCY_WINDOW = 10000
+
+# Largest accepted body of a request.
+_MAX_BODY_BYTES = 64 << 20
+
+# Types of JSON values accepted as cells of rows, objects and arrays are rejected.
+_CELL_TYPES = (str, int, float, bool, type(None))
+
+# Texts of HTTP status codes.
+_STATUS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+           500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+""" M A I N   C L A S S:  ###########################################################################################"""
+
+
+class _Server:
+    """The main class of the Serve module.
+
+    This class serves HTTP/1.1 on localhost with asyncio:
+        POST /predict with {"rows": [[token, ...], ...]} returns {"labels": [...], "version": n},
+        GET /stats returns counters of the server.
+        Rows of concurrent requests are put into a queue and a single task scores them together
+        in a worker thread, once the batch has max_batch_rows rows or its first request waited
+        max_delay seconds. If a batch fails, its requests are scored one by one, so a request
+        fails only by its own rows. The predict module prepares tables again, when a new model
+        is published in the data module, so the next batch is scored by the new model.
+
+    Attributes:
+        _interface_core: An instance of the core interface.
+        _interface_predict: An instance of the predict interface.
+        _interface_data: An instance of the data interface.
+        _host, _port: Address of the server, the port is set when the server is started.
+        _max_batch_rows: Largest number of rows scored at once.
+        _max_delay: Longest wait of a request for other requests, in seconds.
+        _queue: asyncio queue of (rows, future) of requests.
+        _loop: The event loop of the server.
+        _stop_event: asyncio event, which stops the server.
+        _thread: The background thread of the server or None.
+        _ready: threading event set when the server listens.
+        _error: Exception raised while starting the server in the background thread.
+        _latencies: Seconds of the last requests.
+        _counters: A dict with requests, rows, batches and errors.
+        _start_time: Time the server was started.
+    """
+
+    def __init__(self, interface_core, host, port, max_batch_rows, max_delay):
+        """Inits the server instance."""
+        self._interface_core = interface_core
+        self._interface_predict = interface_core.get_interface_by_name('predict')
+        self._interface_data = interface_core.get_interface_data()
+        self._host = host
+        self._port = port
+        self._max_batch_rows = max_batch_rows
+        self._max_delay = max_delay
+        self._queue = None
+        self._loop = None
+        self._stop_event = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._error = None
+        self._latencies = collections.deque(maxlen=_LATENCY_WINDOW)
+        self._counters = {'requests': 0, 'rows': 0, 'batches': 0, 'errors': 0}
+        self._start_time = time.monotonic()
+
+    async def _serve(self):
+        """Listens until the stop event is set."""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._stop_event = asyncio.Event()
+        batcher = asyncio.ensure_future(self._batch())
+        try:
+            server = await asyncio.start_server(self._handle, self._host, self._port)
+        except OSError as error:
+            self._error = error
+            self._ready.set()
+            batcher.cancel()
+            raise
+        self._port = server.sockets[0].getsockname()[1]
+        self._start_time = time.monotonic()
+        self._ready.set()
+        async with server:
+            await self._stop_event.wait()
+        batcher.cancel()
+
+    async def _batch(self):
+        """Takes requests from the queue, scores them in batches and sets results of their futures."""
+        while True:
+            batch = [await self._queue.get()]
+            rows = len(batch[0][0])
+            deadline = self._loop.time() + self._max_delay
+            while rows < self._max_batch_rows:
+                timeout = deadline - self._loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+                rows += len(batch[-1][0])
+            all_rows = [row for request_rows, _ in batch for row in request_rows]
+            try:
+                version, labels = await self._loop.run_in_executor(None, self._predict, all_rows)
+            except Exception as error:
+                if len(batch) == 1:
+                    self._set_exception(batch[0][1], error)
+                else:
+                    # Requests are scored one by one, so only the failing ones get the error
+                    for request_rows, future in batch:
+                        try:
+                            result = await self._loop.run_in_executor(None, self._predict, request_rows)
+                        except Exception as request_error:
+                            self._set_exception(future, request_error)
+                        else:
+                            self._counters['batches'] += 1
+                            if not future.done():
+                                future.set_result(result)
+                continue
+            self._counters['batches'] += 1
+            start = 0
+            for request_rows, future in batch:
+                if not future.done():
+                    future.set_result((version, labels[start:start + len(request_rows)]))
+                start += len(request_rows)
+
+    @staticmethod
+    def _set_exception(future, error):
+        """Sets the exception of the future of a request, unless its client has gone."""
+        if not future.done():
+            future.set_exception(error)
+
+    def _predict(self, rows):
+        """Returns the version of the model and labels of the rows. Runs in a worker thread."""
+
+        #####################################
+        # CALLING METHOD FROM OTHER MODULE! #
+        version = self._interface_data.get_model_nbc_version()
+        labels, _ = self._interface_predict.nbc_predict(rows)
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+        #####################################
+
+        return version, labels.tolist()
+
+    async def _classify(self, body):
+        """Returns the status and the response of the body of a predict request."""
+        try:
+            rows = json.loads(body)['rows']
+            if not isinstance(rows, list) or not all(isinstance(row, list) for row in rows):
+                raise ValueError('rows must be a list of lists')
+            if not all(isinstance(cell, _CELL_TYPES) for row in rows for cell in row):
+                raise ValueError('cells of rows must be strings, numbers, booleans or null')
+        except (ValueError, KeyError, TypeError) as error:
+            return 400, {'error': str(error)}
+        if not rows:
+            return 200, {'labels': [], 'version': self._interface_data.get_model_nbc_version()}
+        future = self._loop.create_future()
+        await self._queue.put((rows, future))
+        try:
+            version, labels = await future
+        except Exception as error:
+            return 503, {'error': str(error)}
+        self._counters['rows'] += len(rows)
+        return 200, {'labels': labels, 'version': version}
+
+    async def _handle(self, reader, writer):
+        """Serves requests of the connection, it is kept alive until the client closes it."""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                start = time.perf_counter()
+                method, path, version = (request_line.decode('latin-1').split() + ['', '', ''])[:3]
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > _MAX_BODY_BYTES:
+                    status, response = 413, {'error': 'body is too big'}
+                else:
+                    body = await reader.readexactly(length) if length else b''
+                    if path == '/predict' and method == 'POST':
+                        status, response = await self._classify(body)
+                    elif path == '/stats' and method == 'GET':
+                        status, response = 200, self.get_stats()
+                    elif path in ('/predict', '/stats'):
+                        status, response = 405, {'error': 'method is not allowed'}
+                    else:
+                        status, response = 404, {'error': 'unknown path'}
+                self._counters['requests'] += 1
+                self._counters['errors'] += status != 200
+                content = json.dumps(response).encode('utf-8')
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                writer.write(b'HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n'
+                             b'Connection: %s\r\n\r\n' % (status, _STATUS[status].encode('latin-1'), len(content),
+                                                          b'keep-alive' if keep_alive else b'close') + content)
+                await writer.drain()
+                if path == '/predict':
+                    self._latencies.append(time.perf_counter() - start)
+                if not keep_alive or status == 413:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Open connections are cancelled when the server stops
+            pass
+        finally:
+            writer.close()
+
+    def run(self):
+        """Runs the server in this thread until it is interrupted."""
+        try:
+            asyncio.run(self._serve())
+        except KeyboardInterrupt:
+            pass
+
+    def start(self):
+        """Runs the server in a background thread, returns the port after the server listens."""
+        self._thread = threading.Thread(target=asyncio.run, args=(self._serve(),), daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        if self._error is not None:
+            raise self._error
+        return self._port
+
+    def stop(self):
+        """Stops the server running in the background thread."""
+        if self._thread is not None and self._loop is not None:
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+            self._thread.join()
+            self._thread = None
+
+    def get_stats(self):
+        """Returns a dict with counters, latency percentiles and throughput."""
+        elapsed = time.monotonic() - self._start_time
+        latencies = numpy.array(self._latencies)
+        p50, p99 = numpy.percentile(latencies, [50, 99]) if len(latencies) else (0.0, 0.0)
+        stats = dict(self._counters, port=self._port, seconds=elapsed,
+                     latency_p50_ms=1000 * p50, latency_p99_ms=1000 * p99,
+                     requests_per_second=self._counters['requests'] / elapsed if elapsed else 0.0,
+                     rows_per_second=self._counters['rows'] / elapsed if elapsed else 0.0,
+                     rows_per_batch=self._counters['rows'] / self._counters['batches']
+                     if self._counters['batches'] else 0.0)
+        return stats
+
+
+""" E N T R Y   P O I N T:  #########################################################################################"""
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serves predictions of the NBC model on localhost.')
+    parser.add_argument('model', help='model file written by the data module')
+    parser.add_argument('--host', default='127.0.0.1', help='address to listen on (default: 127.0.0.1)')
+    parser.add_argument('-p', '--port', type=int, default=8765, help='port to listen on (default: 8765)')
+    parser.add_argument('-b', '--max-batch-rows', type=int, default=4096, help='rows scored at once (default: 4096)')
+    parser.add_argument('-d', '--max-delay', type=float, default=0.005,
+                        help='seconds a request waits for other requests (default: 0.005)')
+    args = parser.parse_args()
+    interface_core = core.InterfaceCore(core.MODULES_HEADLESS, headless=True)
+    #####################################
+    # CALLING METHOD FROM OTHER MODULE! #
+    interface_core.get_interface_data().load_model_nbc(args.model)
+    interface_core.get_interface_by_name('serve').nbc_serve(args.host, args.port, args.max_batch_rows,
+                                                            args.max_delay)
+    # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+    #####################################
+
+
+""" E N D   O F   F I L E.  #########################################################################################"""
@@ -0,0 +1,40 @@
+""" I M P O R T:  ###################################################################################################"""
+
+
+import numpy
+import os
+import pytest
+import sys
+
+# Modules of the application are imported from the root of the repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import core
+
+
+""" F I X T U R E S:  ###############################################################################################"""
+
+
+@pytest.fixture
+def training_file(tmp_path):
+    """Returns the name of a small labeled CSV file with 5 classes, Zipf distributed tokens and empty cells."""
+    rng = numpy.random.default_rng(0)
+    file_name = str(tmp_path / 'train.csv')
+    with open(file_name, 'w') as file:
+        for _ in range(600):
+            label = int(rng.integers(5))
+            cells = ['t%d' % (rng.zipf(1.5) + 3 * label) if rng.random() > 0.1 else '' for _ in range(6)]
+            file.write('%s,%s\n' % ('abcde'[label], ','.join(cells)))
+    return file_name
+
+
+@pytest.fixture
+def interface_core(training_file):
+    """Returns a headless core with the training file set and the model cache disabled."""
+    interface_core = core.InterfaceCore(core.MODULES_HEADLESS, headless=True)
+    interface_core.get_interface_train().nbc_set_cache(None)
+    interface_core.get_interface_data().set_train_file_name(training_file)
+    return interface_core
+
+
+""" E N D   O F   F I L E.  #########################################################################################"""
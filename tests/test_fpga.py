@@ -0,0 +1,33 @@
+""" I M P O R T:  ###################################################################################################"""
+
+
+import data
+import json
+import os
+import pytest
+
+
+""" T E S T S:  #####################################################################################################"""
+
+
+@pytest.mark.parametrize('algorithm', data.ALGORITHMS)
+def test_export_and_emulate(interface_core, training_file, tmp_path, algorithm):
+    """The fixed-point model of every algorithm fits its tables without saturation and agrees with the float model."""
+    interface_core.get_interface_train().nbc_start_train(',', algorithm=algorithm)
+    interface_fpga = interface_core.get_interface_by_name('fpga')
+    interface_fpga.nbc_quantize()
+    files = interface_fpga.nbc_export(str(tmp_path / 'export'))
+    assert all(os.path.getsize(file_name) for file_name in files)
+    with open(files[-1]) as file:
+        header = json.load(file)
+    assert header['algorithm'] == algorithm
+
+    report = interface_fpga.nbc_emulate(training_file, ',')
+    assert report['rows'] == 600
+    assert report['quantization_saturations'] == 0
+    assert report['saturations'] == 0
+    assert report['agreement'] >= 0.99
+    assert report['accuracy_fixed'] >= report['accuracy_float'] - 0.01
+
+
+""" E N D   O F   F I L E.  #########################################################################################"""
@@ -0,0 +1,82 @@
+""" I M P O R T:  ###################################################################################################"""
+
+
+import pandas
+import pytest
+
+
+""" F U N C T I O N S:  #############################################################################################"""
+
+
+def _baseline_model(file_name):
+    """Returns the model dict as the first version of the train module counted it, one class at a time.
+    Empty cells are left out, see _Counts.from_frame."""
+    frame = pandas.read_csv(file_name, header=None, dtype=object)
+    tokens = frame.iloc[:, 1:]
+    groups = frame.groupby([0])
+    return {'w_c': [tokens.loc[frame[0] == label].stack().dropna().apply(str).value_counts().to_dict()
+                    for label in frame[0].unique()],
+            'd_c': groups.size().tolist(),
+            'l_c': groups.count().sum(axis=1).tolist(),
+            'v': tokens.stack().dropna().nunique()}
+
+
+def _train(interface_core, file_name, **kwargs):
+    """Trains the model on the file and returns it in the dict form."""
+    interface_core.get_interface_data().set_train_file_name(file_name)
+    interface_core.get_interface_train().nbc_start_train(',', **kwargs)
+    return interface_core.get_interface_data().get_ready_model_nbc()
+
+
+def _split(file_name, tmp_path, rows):
+    """Writes the first rows and the other lines of the file to two files, returns their names."""
+    with open(file_name) as file:
+        lines = file.readlines()
+    names = [str(tmp_path / 'head.csv'), str(tmp_path / 'tail.csv')]
+    for name, part in zip(names, (lines[:rows], lines[rows:])):
+        with open(name, 'w') as file:
+            file.writelines(part)
+    return names
+
+
+""" F I X T U R E S:  ###############################################################################################"""
+
+
+@pytest.fixture
+def mixed_label_file(tmp_path):
+    """Returns the name of a file, which labels look numeric in the first chunks and are not later."""
+    file_name = str(tmp_path / 'mixed.csv')
+    with open(file_name, 'w') as file:
+        for i in range(600):
+            label = '01'[i % 2] if i < 400 else '01x'[i % 3]
+            file.write('%s,t%d,t%d,%d\n' % (label, i % 7, i % 11, i % 5))
+    return file_name
+
+
+""" T E S T S:  #####################################################################################################"""
+
+
+def test_model_equals_baseline(interface_core, training_file):
+    """The single pass counting engine gives the same model dict as the baseline."""
+    assert _train(interface_core, training_file) == _baseline_model(training_file)
+
+
+@pytest.mark.parametrize('fixture', ['training_file', 'mixed_label_file'])
+def test_training_paths_are_equal(interface_core, tmp_path, request, fixture):
+    """Full read, chunks, shards and updates of the same rows give the same model."""
+    file_name = request.getfixturevalue(fixture)
+    full = _train(interface_core, file_name)
+    assert full == _baseline_model(file_name)
+    assert _train(interface_core, file_name, memory_budget=50000) == full
+    assert _train(interface_core, file_name, workers=3) == full
+
+    head, tail = _split(file_name, tmp_path, 250)
+    partial = _train(interface_core, head)
+    interface_train = interface_core.get_interface_train()
+    interface_train.nbc_update(tail, ',')
+    assert interface_core.get_interface_data().get_ready_model_nbc() == full
+    interface_train.nbc_update(tail, ',', remove=True)
+    assert interface_core.get_interface_data().get_ready_model_nbc() == partial
+
+
+""" E N D   O F   F I L E.  #########################################################################################"""
@@ -2,8 +2,20 @@
 
 
 import core
+import bz2
+import concurrent.futures
+import data
+import gzip
+import hashlib
+import io
+import json
+import lzma
+import mmap
+import numpy
+import os
 import pandas
-import copy
+import sys
+import time
 
 
 """ G E T   I N T E R F A C E   I N S T A N C E:  ###################################################################"""
@@ -26,6 +38,7 @@ class InterfaceTrain:
         _main_module_object: An instance of the main class.
         _interface_core: An instance of the core interface.
         _interface_data: An instance of the data interface.
+        _cache: An instance of the cache of trained models or None.
     """
 
     def __init__(self, interface_core: core.InterfaceCore):
@@ -33,17 +46,227 @@ class InterfaceTrain:
         self._main_module_object = None
         self._interface_core = interface_core
         self._interface_data = interface_core.get_interface_data()
+        self._cache = _ModelCache(_CACHE_DIRECTORY, _CACHE_MAX_BYTES)
 
-    def nbc_start_train(self, delimiter: str):
-        """Calculates parameters for naive bayesian classifier model."""
-        self._main_module_object = _NBC(self._interface_core, self._interface_data.get_train_file_name(), delimiter)
+    def nbc_start_train(self, delimiter: str, memory_budget: int = None, workers: int = 1, progress=None,
+                        cancel=None, engine: str = 'c', buckets: int = 0, algorithm: str = 'multinomial'):
+        """Calculates parameters for naive bayesian classifier model.
+        If memory_budget (bytes) is set, the file is streamed in chunks which fit in the budget.
+        If workers > 1, the file is split into shards counted in parallel processes.
+        progress(phase, rows) is called and published to the 'train.progress' topic of the message bus
+            of the core after every phase and chunk. If the cancel event (threading.Event) is set,
+            training stops with TrainingCancelled.
+        engine is the parser of pandas.read_csv, 'pyarrow' needs the pyarrow package and cannot read in chunks.
+        Files ending with .gz, .bz2, .xz or .zst are decompressed while reading, .zst needs the zstandard package.
+        If buckets > 0, tokens are hashed into that many buckets, so the size of the model does not
+            depend on the number of distinct tokens, see data.ModelNBC.hash_tokens.
+        algorithm is 'multinomial', 'bernoulli' or 'complement' naive Bayes, see data.ALGORITHM_REGISTRY.
+        A model trained before on the same file content is loaded from the cache."""
+        if engine == 'pyarrow' and memory_budget is not None:
+            raise ValueError('The pyarrow engine cannot read in chunks, memory_budget needs the c engine')
+        file_name = self._interface_data.get_train_file_name()
+        self._main_module_object = _NBC(self._interface_core, file_name, delimiter, memory_budget, workers, progress,
+                                        cancel, engine, buckets, (algorithm,))
+        if self._cache is None:
+            key = None
+        else:
+            # nbc2 models have string labels, older cached models may have labels inferred by pandas
+            key = self._cache.get_key(file_name, delimiter, 'nbc2-%s-%d-%s' % (engine, buckets, algorithm))
+            cached = self._cache.get(key)
+            if cached is not None:
+
+                #####################################
+                # CALLING METHOD FROM OTHER MODULE! #
+                self._interface_data.load_model_nbc(cached)
+                self._main_module_object.set_model(self._interface_data.get_model_nbc())
+                # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+                #####################################
+
+                return
 
         #####################################
         # CALLING METHOD FROM OTHER MODULE! #
         self._interface_data.set_ready_model_nbc(self._main_module_object.get_ready_model())
+        if key is not None:
+            self._cache.put(key, self._interface_data.save_model_nbc)
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+        #####################################
+
+    def nbc_train_algorithms(self, delimiter: str, algorithms=None, memory_budget: int = None, workers: int = 1,
+                             progress=None, cancel=None, engine: str = 'c', buckets: int = 0, test_file: str = None):
+        """Trains models of several algorithms (all if None) with a single pass over the training file.
+        Models are added to the model registry of the data module under names of their algorithms and
+            the first one is published. Other arguments are as in nbc_start_train, the cache is not used.
+        If the labeled test_file is given, it is classified by every model.
+        Returns a list of dicts with the algorithm, tokens of the model and accuracy or None."""
+        algorithms = list(_ALGORITHMS) if algorithms is None else list(algorithms)
+        if engine == 'pyarrow' and memory_budget is not None:
+            raise ValueError('The pyarrow engine cannot read in chunks, memory_budget needs the c engine')
+        self._main_module_object = _NBC(self._interface_core, self._interface_data.get_train_file_name(), delimiter,
+                                        memory_budget, workers, progress, cancel, engine, buckets, algorithms)
+        models = self._main_module_object.get_ready_models()
+        frame = None
+        if test_file is not None:
+            n_columns = _count_columns(test_file, delimiter)
+            with _open_file(test_file) as file:
+                frame = data.read_table(file, delimiter, n_columns, engine=engine)
+        interface_predict = self._interface_core.get_interface_by_name('predict')
+        report = []
+        for algorithm, model in models.items():
+
+            #####################################
+            # CALLING METHOD FROM OTHER MODULE! #
+            self._interface_data.add_model_nbc(algorithm, model)
+            accuracy = None if frame is None else interface_predict.nbc_evaluate_model(
+                model, frame.iloc[:, 1:], frame[0].to_numpy())[0]
+            # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+            #####################################
+
+            report.append({'algorithm': algorithm, 'tokens': len(model.tokens), 'accuracy': accuracy})
+
+        #####################################
+        # CALLING METHOD FROM OTHER MODULE! #
+        self._interface_data.publish_model_nbc(algorithms[0])
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+        #####################################
+
+        return report
+
+    def nbc_set_cache(self, directory: str = None, max_bytes: int = None):
+        """Sets the directory and the size limit of the cache of trained models. None directory turns it off."""
+        self._cache = None if directory is None else _ModelCache(directory, max_bytes or _CACHE_MAX_BYTES)
+
+    def nbc_get_cache_stats(self):
+        """Returns a dict with hits, misses, evictions, entries and bytes of the cache, None if it is off."""
+        return None if self._cache is None else self._cache.get_stats()
+
+    def nbc_collision_report(self, buckets: int):
+        """Returns a dict, which shows how the current model trained without hashing would be hashed into buckets:
+        tokens, used buckets, tokens sharing a bucket and their share of token occurrences, and sizes of w_c."""
+
+        #####################################
+        # CALLING METHOD FROM OTHER MODULE! #
+        model = self._interface_data.get_model_nbc()
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+        #####################################
+
+        if model is None or model.buckets:
+            raise ValueError('The collision report needs a model trained without hashing')
+        return _collision_report(model, buckets)
+
+    def nbc_cross_validate(self, delimiter: str, folds: int = 5, alphas=(1.0,), workers: int = 1, seed: int = None,
+                           buckets: int = 0, algorithm: str = 'multinomial'):
+        """Estimates accuracy of models trained on the training file by k-fold cross-validation for every
+        additive smoothing constant in alphas. Rows are split into folds in turn, or randomly if seed is set.
+        Every fold is counted once, counts of a training split are the totals minus counts of the fold.
+        Folds are scored in workers threads. The published model is not changed.
+        algorithm is the algorithm of the models, as in nbc_start_train.
+        Returns a list of dicts with alpha, accuracy over all rows and accuracies of folds."""
+        cross_validation = _NBC(self._interface_core, self._interface_data.get_train_file_name(), delimiter,
+                                buckets=buckets, algorithms=(algorithm,))
+        frame, fold_of = cross_validation.count_folds(folds, seed)
+        interface_predict = self._interface_core.get_interface_by_name('predict')
+
+        def evaluate(fold):
+            test = fold_of == fold
+
+            #####################################
+            # CALLING METHOD FROM OTHER MODULE! #
+            return interface_predict.nbc_evaluate_model(cross_validation.get_split_model(fold),
+                                                        frame.loc[test, frame.columns[1:]], frame.loc[test, 0],
+                                                        alphas)
+            # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+            #####################################
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            accuracies = numpy.array(list(executor.map(evaluate, range(folds)))).reshape(folds, len(alphas))
+        rows = numpy.bincount(fold_of, minlength=folds)
+        return [{'alpha': alpha, 'accuracy': float(rows @ accuracies[:, i] / rows.sum()) if rows.sum() else 0.0,
+                 'fold_accuracies': accuracies[:, i].tolist()} for i, alpha in enumerate(alphas)]
+
+    def nbc_preflight(self, file_name: str, delimiter: str = None):
+        """Checks the file before training from lines sampled at its head and at random offsets in milliseconds.
+        The delimiter is detected if it is None. Returns a dict with the delimiter, columns, sampled lines,
+            lines with another number of columns, estimated rows, classes, vocabulary (a lower bound), training
+            seconds and memory bytes of training the file at once, and a list of problems.
+            Estimates of a compressed file are made from its head only, rows are unknown (None)
+            unless it is a gzip file."""
+        return _preflight(file_name, delimiter)
+
+    def nbc_update(self, file_name: str, delimiter: str, remove: bool = False):
+        """Folds rows of the file into the counts of the current NBC model, or takes them out if remove is True,
+        and publishes the new model. Only the file is read, the training data of the model is not read again.
+        Counts of the model are kept after the first update, so the next updates cost about the size of
+            their files. A loaded Bernoulli model cannot be updated, it does not keep numbers of occurrences.
+        The parser engine of the last training and the buckets of the model are used."""
+
+        #####################################
+        # CALLING METHOD FROM OTHER MODULE! #
+        model = self._interface_data.get_model_nbc()
         # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
         #####################################
 
+        if self._main_module_object is None:
+            self._main_module_object = _NBC(self._interface_core, file_name, delimiter)
+        model = self._main_module_object.update(file_name, delimiter, remove, model)
+
+        #####################################
+        # CALLING METHOD FROM OTHER MODULE! #
+        self._interface_data.set_ready_model_nbc(model)
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+        #####################################
+
+
+""" E X C E P T I O N S:  ###########################################################################################"""
+
+
+class TrainingCancelled(Exception):
+    """Raised when training is cancelled through the cancel event."""
+
+
+""" C O N S T A N T S:  #############################################################################################"""
+
+
+# Bytes read from the head of a file to estimate the length of a line.
+_SAMPLE_BYTES = 1 << 16
+
+# Estimated memory of one parsed cell: a string object, a pointer to it and the integer codes used while counting.
+_CELL_BYTES = 96
+
+# Default directory and size limit of the cache of trained models.
+_CACHE_DIRECTORY = os.path.join(os.path.expanduser('~'), '.cache', 'fpga_project', 'models')
+_CACHE_MAX_BYTES = 1 << 30
+
+# Bytes read at once while hashing a file.
+_HASH_BLOCK_BYTES = 1 << 20
+
+# Functions opening compressed files by extension, .zst files are opened by the optional zstandard package.
+_DECOMPRESSORS = {'.gz': gzip.open, '.bz2': bz2.open, '.xz': lzma.open}
+
+# Extensions of compressed files, which cannot be split into shards.
+_COMPRESSED_EXTENSIONS = ('.gz', '.bz2', '.xz', '.zst')
+
+# Algorithms and the statistic of _Counts, which their models keep in w_c, see data.ALGORITHM_REGISTRY.
+_ALGORITHMS = {algorithm: statistic for algorithm, (_, statistic) in data.ALGORITHM_REGISTRY.items()}
+
+# Counts are kept by keys class << _KEY_BITS | token, see _Counts.
+_KEY_BITS = 32
+_KEY_MASK = (1 << _KEY_BITS) - 1
+
+# Pairs (class, token) of a table are counted by numpy.bincount over all cells of classes x tokens,
+# if there are at most this many cells per pair, and by sorting the pairs otherwise.
+_DENSE_CELLS_PER_PAIR = 4
+
+# Delimiters detected by the preflight check, in order of preference on ties.
+_DELIMITERS = (',', '\t', ';', '|', ' ')
+
+# Random offsets of a file sampled by the preflight check and bytes read at each of them.
+_PREFLIGHT_PROBES = 64
+_PREFLIGHT_PROBE_BYTES = 4096
+
+# Cells counted per second when a file is read at once, measured with the medium preset of bench.py.
+_CELLS_PER_SECOND = 2e6
+
 
 """ M A I N   C L A S S:  ###########################################################################################"""
 
@@ -56,53 +279,785 @@ class _NBC:
 
     Attributes:
         _interface_core: An instance of the core interface.
-        _data_frame: A table with training data.
+        _file_name: Name of file with training data.
+        _delimiter: Delimiter of the file.
+        _memory_budget: Memory in bytes for chunks of the file. None to read the file at once.
+        _workers: Number of processes counting shards of the file.
+        _progress: A function progress(phase, rows) or None.
+        _cancel: A threading.Event, which stops training, or None.
+        _engine: Parser engine of pandas.read_csv.
+        _buckets: Number of buckets in the hashing mode or 0.
+        _algorithms: Names of algorithms, which models are built from the counts, the first one is published.
+        _document_frequency: True if an algorithm needs document frequencies.
+        _rows: Number of rows counted so far.
+        _data_frame: A table with training data. None if the file is read in chunks or shards.
+            The file is read only when the model is requested.
+        _counts: Sufficient statistics of the table, see _Counts.
         _v, _d_c, _l_c, _w_c: Parameters for model: log(_d_c/d)+sum(log((_w_c+1)/(_v+_l_c)))
-        _model: A dict with all parameters.
-            Keys: 'v': _v, 'd_c': _d_c, 'l_c': _l_c, 'w_c': _w_c.
+        _model: An instance of data.ModelNBC with all parameters.
+        _models: A dict algorithm: model of the models built from _counts.
+        _fold_counts: Counts of every fold of cross-validation or None.
     """
 
-    def __init__(self, interface_core, file_name, delimiter):
+    def __init__(self, interface_core, file_name, delimiter, memory_budget=None, workers=1, progress=None,
+                 cancel=None, engine='c', buckets=0, algorithms=('multinomial',)):
         """Inits the interface instance."""
+        for algorithm in algorithms:
+            if algorithm not in _ALGORITHMS:
+                raise ValueError('Unknown algorithm %r, it must be one of %s' % (algorithm, ', '.join(_ALGORITHMS)))
         self._interface_core = interface_core
-        self._data_frame = pandas.read_csv(file_name, sep=delimiter, header=None)
+        self._file_name = file_name
+        self._delimiter = delimiter
+        self._memory_budget = memory_budget
+        self._workers = workers
+        self._progress = progress
+        self._cancel = cancel
+        self._engine = engine
+        self._buckets = buckets
+        self._algorithms = tuple(algorithms)
+        self._document_frequency = any(_ALGORITHMS[algorithm] == 'df_c' for algorithm in algorithms)
+        self._rows = 0
+        self._data_frame = None
+        self._counts = None
         self._v = None
         self._d_c = []
         self._l_c = []
         self._w_c = []
         self._model = {}
+        self._models = {}
+        self._fold_counts = None
+
+    def _report(self, phase, rows=None):
+        """Reports the phase and the number of rows counted so far. Raises TrainingCancelled if cancelled."""
+        if rows is not None:
+            self._rows = rows
+        if self._cancel is not None and self._cancel.is_set():
+            raise TrainingCancelled()
+        if self._progress is not None:
+            self._progress(phase, self._rows)
+        self._interface_core.publish('train.progress', phase, self._rows)
+
+    def _chunk_rows(self, n_columns):
+        """Returns the number of rows in a chunk, which fits in the memory budget of one worker."""
+        if self._memory_budget is None:
+            return None
+        with _open_file(self._file_name) as file:
+            sample = file.read(_SAMPLE_BYTES)
+        line_bytes = len(sample) / max(sample.count(b'\n'), 1)
+
+        # Half of the budget is left for the accumulated counts and the parser buffers
+        row_bytes = n_columns * _CELL_BYTES + 2 * line_bytes
+        return max(int(self._memory_budget / max(self._workers, 1) / 2 / row_bytes), 1)
+
+    def _count_chunks(self, n_columns):
+        """Calculates _counts reading the file in chunks."""
+        with _open_file(self._file_name) as file:
+            self._counts = _count_file(file, self._delimiter, n_columns, self._chunk_rows(n_columns),
+                                       lambda rows: self._report('counting', rows), self._engine, self._buckets,
+                                       self._document_frequency)
+
+    def _count_shards(self, n_columns):
+        """Calculates _counts counting shards of the file in a process pool and merging them pairwise."""
+        chunk_rows = self._chunk_rows(n_columns)
+        shards = _shard_ranges(self._file_name, self._workers)
+        executor = concurrent.futures.ProcessPoolExecutor(max_workers=self._workers)
+        try:
+            futures = [executor.submit(_count_shard, self._file_name, self._delimiter, start, end, n_columns,
+                                       chunk_rows, self._engine, self._buckets, self._document_frequency)
+                       for start, end in shards]
+            for future in concurrent.futures.as_completed(futures):
+                self._report('counting', self._rows + int(future.result().d_c.sum()))
+            parts = [future.result() for future in futures]
+
+            # Tree reduction, neighbours are merged so classes keep the order of the file
+            while len(parts) > 1:
+                self._report('merging')
+                futures = [executor.submit(_merge_counts, parts[i], parts[i + 1]) for i in range(0, len(parts) - 1, 2)]
+                parts = [future.result() for future in futures] + parts[len(futures) * 2:]
+        finally:
+            executor.shutdown(cancel_futures=True)
+        self._counts = parts[0] if parts else _Counts.empty(self._buckets, self._document_frequency)
+
+    def _set_model(self):
+        """Sets _model, _v, _d_c, _l_c and _w_c from _counts."""
+        self._model = self._counts.to_model(self._algorithms[0])
+        self._models = {self._algorithms[0]: self._model}
+        self._v = self._model.v
+        self._d_c = self._model.d_c
+        self._l_c = self._model.l_c
+        self._w_c = self._model.w_c
 
-    def _count_v(self):
-        """Calculates _v."""
-        self._v = self._data_frame.iloc[:, 1:].stack().nunique()
-
-    def _count_d_c(self):
-        """Calculates _d_c."""
-        values = self._data_frame.groupby([0]).size()
-        for i in range(0, self._data_frame[0].nunique()):
-            self._d_c.append(values[i])
-
-    def _count_l_c(self):
-        """Calculates _l_c."""
-        for i in range(0, self._data_frame[0].nunique()):
-            self._l_c.append(self._data_frame.groupby([0]).count().sum(axis=1)[i])
-
-    def _count_w_c(self):
-        """Calculates _w_c."""
-        classes = self._data_frame[0].unique()
-        for i in range(0, self._data_frame[0].nunique()):
-            stacked = self._data_frame.loc[self._data_frame[0] == classes[i]].iloc[:, 1:].stack()
-            stacked = stacked.apply(str)
-            self._w_c.append(stacked.value_counts().to_dict())
+    def _count_all(self):
+        """Calculates _v, _d_c, _l_c and _w_c in a single pass over the table."""
+        profiler = self._interface_core.get_profiler()
+        self._report('reading', 0)
+        if self._memory_budget is None and self._workers <= 1:
+            with profiler.span('train.read_csv') as span, _open_file(self._file_name) as file:
+                self._data_frame = data.read_table(file, self._delimiter,
+                                                   _count_columns(self._file_name, self._delimiter),
+                                                   engine=self._engine)
+                span.add_rows(len(self._data_frame))
+            self._report('counting', len(self._data_frame))
+            with profiler.span('train.count') as span:
+                self._counts = _Counts.from_frame(self._data_frame, self._buckets, self._document_frequency)
+                span.add_rows(len(self._data_frame))
+        else:
+            with profiler.span('train.read_count') as span:
+                n_columns = _count_columns(self._file_name, self._delimiter)
+                # A compressed file cannot be split at byte offsets, it is read as one stream
+                if self._workers > 1 and _get_extension(self._file_name) not in _COMPRESSED_EXTENSIONS:
+                    self._count_shards(n_columns)
+                else:
+                    self._count_chunks(n_columns)
+                span.add_rows(self._rows)
+        self._report('building')
+        with profiler.span('train.build'):
+            self._set_model()
 
     def get_ready_model(self):
         """Returns variable with all NBC model parameters."""
-        self._count_w_c()
-        self._count_d_c()
-        self._count_v()
-        self._count_l_c()
-        self._model = {'w_c': self._w_c, 'd_c': self._d_c, 'l_c': self._l_c, 'v': self._v}
-        return copy.deepcopy(self._model)
+        self._count_all()
+        return self._model
+
+    def get_ready_models(self):
+        """Counts the file once and returns a dict algorithm: model for every algorithm."""
+        self._count_all()
+        self._models = {algorithm: self._model if i == 0 else self._counts.to_model(algorithm)
+                        for i, algorithm in enumerate(self._algorithms)}
+        return dict(self._models)
+
+    def set_model(self, model):
+        """Sets the model trained before, so it can be updated."""
+        self._counts = None
+        self._models = {}
+        self._buckets = model.buckets
+        self._algorithms = (model.algorithm,)
+        self._document_frequency = _ALGORITHMS[model.algorithm] == 'df_c'
+        self._model = model
+        self._v, self._d_c, self._l_c, self._w_c = model.v, model.d_c, model.l_c, model.w_c
+
+    def count_folds(self, folds, seed=None):
+        """Reads the file, counts every fold and sums them in _counts.
+        Returns the table (rows with labels only) and the fold of every row."""
+        with _open_file(self._file_name) as file:
+            frame = data.read_table(file, self._delimiter, _count_columns(self._file_name, self._delimiter),
+                                    engine=self._engine)
+        frame = frame[frame[0].notna()].reset_index(drop=True)
+        fold_of = numpy.arange(len(frame)) % folds
+        if seed is not None:
+            fold_of = numpy.random.default_rng(seed).permutation(fold_of)
+        self._fold_counts = [_Counts.from_frame(frame[fold_of == fold], self._buckets, self._document_frequency)
+                             for fold in range(folds)]
+        self._counts = _Counts.empty(self._buckets, self._document_frequency)
+        for counts in self._fold_counts:
+            self._counts.add(counts)
+        return frame, fold_of
+
+    def get_split_model(self, fold):
+        """Returns the model trained on all folds except the fold, see count_folds."""
+        split = self._counts.copy()
+        split.add(self._fold_counts[fold], -1)
+        return split.to_model(self._algorithms[0])
+
+    def update(self, file_name, delimiter, remove=False, model=None):
+        """Adds rows of the file to the counts of the model, or subtracts them if remove is True,
+        and returns the new model. The counts are taken from the model, unless it was built from them."""
+        if model is not None and model is not self._models.get(model.algorithm):
+            self.set_model(model)
+        elif model is not None:
+            self._algorithms = (model.algorithm,)
+        if self._counts is None and isinstance(self._model, data.ModelNBC):
+            self._counts = _Counts.from_model(self._model)
+        elif self._counts is None:
+            self._counts = _Counts.empty(self._buckets, self._document_frequency)
+        with _open_file(file_name) as file:
+            delta = _count_file(file, delimiter, _count_columns(file_name, delimiter), None, None, self._engine,
+                                self._buckets, self._counts.df_c is not None)
+        self._counts.add(delta, -1 if remove else 1)
+        self._set_model()
+        return self._model
+
+
+""" S E C O N D A R Y   C L A S S:  #################################################################################"""
+
+
+class _Counts:
+    """Sufficient statistics of a training table.
+
+    Labels and tokens are factorized once into integer codes and every count
+        is taken with numpy over the codes, so no Python code runs per cell.
+        Classes are kept in order of first appearance. Counts of several tables
+        are merged with add, so a big file can be counted chunk by chunk.
+        Only pairs of a class and a token, which occur, are kept: their keys (class << _KEY_BITS | token)
+        are sorted and their counts are in arrays of the same order. Counts of added tables are kept aside
+        and merged into the keys when they get as big as them, so adding a table costs about its size.
+        In the hashing mode tokens are numbers of buckets.
+        Document frequencies are counted in the same pass if an algorithm needs them, see _ALGORITHMS.
+
+    Attributes:
+        labels: Class labels in order of first appearance.
+        tokens: Token strings, the numbers of tokens in keys.
+        d_c: Number of rows per class.
+        keys: Sorted keys of pairs of a class and a token.
+        w_c: Number of times the token occurs in the class per key.
+        df_c: Number of rows of the class, which contain the token, per key or None.
+        buckets: Number of buckets in the hashing mode or 0.
+        _label_index, _token_index: Dicts label: class and token: number, built on the first add.
+        _pending: A list of (keys, w_c, df_c) of added tables, which are not merged yet.
+        _pending_size: Number of keys in _pending.
+        _token_array: Numpy array with interned tokens for models or None, it is extended with new tokens.
+    """
+
+    def __init__(self, labels, tokens, d_c, keys, w_c, buckets=0, df_c=None):
+        """Inits the counts instance."""
+        self.labels = labels
+        self.tokens = tokens
+        self.d_c = d_c
+        self.keys = keys
+        self.w_c = w_c
+        self.df_c = df_c
+        self.buckets = buckets
+        self._label_index = None
+        self._token_index = None
+        self._pending = []
+        self._pending_size = 0
+        self._token_array = None
+
+    @classmethod
+    def empty(cls, buckets=0, document_frequency=False):
+        """Returns counts of an empty table."""
+        return cls([], [], numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64),
+                   numpy.zeros(0, dtype=numpy.int64), buckets,
+                   numpy.zeros(0, dtype=numpy.int64) if document_frequency else None)
+
+    @classmethod
+    def from_frame(cls, data_frame, buckets=0, document_frequency=False):
+        """Counts a table with the label in column 0 and tokens in the other columns, see data.tokenize.
+        If buckets > 0, tokens are hashed into buckets. If document_frequency is True, df_c is counted too."""
+        label_codes, labels = pandas.factorize(data_frame[0])
+
+        # Factorizing every column, then the tokens of all columns into the global vocabulary
+        column_codes, uniques, offset = [], [], 0
+        for col in data_frame.columns[1:]:
+            codes, tokens = data.tokenize(data_frame[col])
+            column_codes.append((codes, offset))
+            uniques.append(tokens)
+            offset += len(tokens)
+        token_codes, tokens = pandas.factorize(pandas.Series(numpy.concatenate(uniques) if uniques else [],
+                                                             dtype=object))
+        if buckets:
+            bucket_codes, tokens = pandas.factorize(data.ModelNBC.hash_tokens(tokens, buckets))
+            token_codes = bucket_codes[token_codes]
+            tokens = tokens.astype(str).tolist()
+
+        # Mapping local column codes to the global vocabulary and counting pairs (class, token)
+        n_classes, n_tokens = len(labels), max(len(tokens), 1)
+        pairs = []
+        for codes, offset in column_codes:
+            mask = (codes >= 0) & (label_codes >= 0)
+            pairs.append(label_codes[mask].astype(numpy.int64) * n_tokens + token_codes[offset + codes[mask]])
+        pairs = numpy.concatenate(pairs) if pairs else numpy.empty(0, dtype=numpy.int64)
+        pairs, w_c = _count_pairs(pairs, n_classes * n_tokens)
+        d_c = numpy.bincount(label_codes[label_codes >= 0], minlength=n_classes)
+        df_c = None
+        if document_frequency:
+            # A token is counted once per row: tokens of every row are sorted and repeats are skipped.
+            # Rows contain exactly the pairs, which occur, so document frequencies have the same keys.
+            matrix = numpy.full((len(label_codes), len(column_codes)), -1, dtype=numpy.int64)
+            for i, (codes, offset) in enumerate(column_codes):
+                present = codes >= 0
+                matrix[present, i] = token_codes[offset + codes[present]]
+            matrix.sort(axis=1)
+            first = numpy.ones(matrix.shape, dtype=bool)
+            first[:, 1:] = matrix[:, 1:] != matrix[:, :-1]
+            mask = first & (matrix >= 0) & (label_codes >= 0)[:, numpy.newaxis]
+            df_c = _count_pairs((label_codes.astype(numpy.int64)[:, numpy.newaxis] * n_tokens + matrix)[mask],
+                                n_classes * n_tokens)[1]
+        keys = (pairs // n_tokens) << _KEY_BITS | pairs % n_tokens
+        return cls(list(labels), list(tokens), d_c, keys, w_c, buckets, df_c)
+
+    @classmethod
+    def from_model(cls, model):
+        """Returns counts of a data.ModelNBC, which keeps numbers of token occurrences."""
+        if _ALGORITHMS[model.algorithm] != 'w_c':
+            raise ValueError('A %s model does not keep numbers of token occurrences' % model.algorithm)
+        class_of = numpy.empty(len(model.order), dtype=numpy.int64)
+        class_of[model.order] = numpy.arange(len(model.order))
+        keys = class_of[model.w_c.get_rows()] << _KEY_BITS | model.w_c.indices
+        order = numpy.argsort(keys)
+        return cls([model.labels[i] for i in model.order], list(model.tokens),
+                   model.d_c[model.order].astype(numpy.int64), keys[order],
+                   model.w_c.data[order].astype(numpy.int64), model.buckets)
+
+    def copy(self):
+        """Returns a copy of the counts."""
+        self._merge()
+        return _Counts(list(self.labels), list(self.tokens), self.d_c.copy(), self.keys.copy(), self.w_c.copy(),
+                       self.buckets, None if self.df_c is None else self.df_c.copy())
+
+    def __getstate__(self):
+        """Returns the state for pickling to another process. Pending counts are merged first and
+        the indexes are left out, they are built again on the first add."""
+        self._merge()
+        return dict(self.__dict__, _label_index=None, _token_index=None, _token_array=None)
+
+    def _index(self, index, keys, values, append):
+        """Returns positions of values in keys. Missing values are appended or get position -1."""
+        positions = numpy.empty(len(values), dtype=numpy.int64)
+        for i, value in enumerate(values):
+            position = index.get(value)
+            if position is None:
+                if append:
+                    position = index[value] = len(keys)
+                    keys.append(value)
+                else:
+                    position = -1
+            positions[i] = position
+        return positions
+
+    def _merge(self):
+        """Merges the pending counts into keys, w_c and df_c, pairs with zero counts are left out."""
+        if not self._pending:
+            return
+        keys = numpy.concatenate([self.keys] + [part[0] for part in self._pending])
+        w_c = numpy.concatenate([self.w_c] + [part[1] for part in self._pending])
+        order = numpy.argsort(keys, kind='stable')
+        keys = keys[order]
+        starts = numpy.flatnonzero(numpy.concatenate(([True], keys[1:] != keys[:-1])))
+        w_c = numpy.add.reduceat(w_c[order], starts)
+        nonzero = w_c != 0
+        self.keys, self.w_c = keys[starts][nonzero], w_c[nonzero]
+        if self.df_c is not None:
+            df_c = numpy.concatenate([self.df_c] + [part[2] for part in self._pending])
+            self.df_c = numpy.add.reduceat(df_c[order], starts)[nonzero]
+        self._pending, self._pending_size = [], 0
+
+    def add(self, other, sign=1):
+        """Adds counts of another table in place, or subtracts them if sign is -1.
+        The cost depends on the size of the other table, merges of added counts take a share of the size
+            of these counts. Subtracted rows must have been added before, otherwise ValueError is raised
+            and the counts are not changed."""
+        if self._label_index is None:
+            self._label_index = {label: i for i, label in enumerate(self.labels)}
+            self._token_index = {token: i for i, token in enumerate(self.tokens)}
+        if (self.df_c is None) != (other.df_c is None):
+            raise ValueError('Cannot add counts with and without document frequencies')
+        other._merge()
+        rows = self._index(self._label_index, self.labels, other.labels, sign > 0)
+        columns = self._index(self._token_index, self.tokens, other.tokens, sign > 0)
+        key_rows, key_columns = rows[other.keys >> _KEY_BITS], columns[other.keys & _KEY_MASK]
+        keys = key_rows << _KEY_BITS | key_columns
+        if sign < 0:
+            if other.d_c[rows < 0].any() or (key_rows < 0).any() or (key_columns < 0).any():
+                raise ValueError('Cannot remove rows of unknown classes or tokens')
+            self._merge()
+            positions = numpy.minimum(numpy.searchsorted(self.keys, keys), max(len(self.keys) - 1, 0))
+            if len(keys) and (not len(self.keys) or (self.keys[positions] != keys).any()
+                              or (self.w_c[positions] < other.w_c).any()):
+                raise ValueError('Cannot remove more rows than were counted')
+            known = rows >= 0
+            if (self.d_c[rows[known]] < other.d_c[known]).any():
+                raise ValueError('Cannot remove more rows than were counted')
+            self.w_c[positions] -= other.w_c
+            if self.df_c is not None:
+                self.df_c[positions] -= other.df_c
+            self.d_c[rows[known]] -= other.d_c[known]
+            return
+        d_c = numpy.zeros(len(self.labels), dtype=numpy.int64)
+        d_c[:len(self.d_c)] = self.d_c
+        d_c[rows] += other.d_c
+        self.d_c = d_c
+        self._pending.append((keys, other.w_c, other.df_c))
+        self._pending_size += len(keys)
+        if self._pending_size >= len(self.keys):
+            self._merge()
+
+    def to_model(self, algorithm='multinomial'):
+        """Returns the model of the algorithm, see data.ModelNBC and _ALGORITHMS.
+        Classes without rows and tokens without counts are left out."""
+        self._merge()
+        rows = numpy.flatnonzero(self.d_c > 0)
+        by_label = numpy.asarray(pandas.Index([self.labels[i] for i in rows]).argsort(), dtype=numpy.intp)
+        rows = rows[by_label]
+        new_row = numpy.full(len(self.labels), -1, dtype=numpy.int64)
+        new_row[rows] = numpy.arange(len(rows))
+        key_rows, key_columns = new_row[self.keys >> _KEY_BITS], self.keys & _KEY_MASK
+        kept = (key_rows >= 0) & (self.w_c > 0)
+        key_rows, key_columns, w_c = key_rows[kept], key_columns[kept], self.w_c[kept]
+        columns = numpy.flatnonzero(numpy.bincount(key_columns, minlength=len(self.tokens)))
+        new_column = numpy.full(len(self.tokens), -1, dtype=numpy.int64)
+        new_column[columns] = numpy.arange(len(columns))
+
+        # Rows of the model are in order of labels, tokens of a row stay ascending
+        order = numpy.argsort(key_rows, kind='stable')
+        statistic = w_c if _ALGORITHMS[algorithm] == 'w_c' else self.df_c[kept]
+        matrix = data.CountMatrix.from_rows((len(rows), len(columns)), key_rows[order],
+                                            new_column[key_columns[order]], statistic[order])
+        l_c = numpy.bincount(key_rows, weights=w_c, minlength=len(rows)).astype(numpy.int64)
+
+        # Only tokens added since the last model are interned
+        known = 0 if self._token_array is None else len(self._token_array)
+        if known < len(self.tokens):
+            added = numpy.array([sys.intern(token) for token in self.tokens[known:]], dtype=object)
+            self._token_array = added if not known else numpy.concatenate((self._token_array, added))
+        return data.ModelNBC([self.labels[i] for i in rows], self._token_array[columns], matrix,
+                             self.d_c[rows], l_c, len(columns), numpy.argsort(by_label), buckets=self.buckets,
+                             algorithm=algorithm)
+
+
+class _ModelCache:
+    """The cache of trained models on disk.
+
+    Models are saved in the binary format of the data module under a key made from
+        the hash of the content of the training file, the delimiter and the algorithm.
+        The hash of a file is kept with its modification time and size, so an unchanged
+        file is not read again. The least recently used models are removed when
+        the cache gets bigger than its limit. Size and last use of a model are the size and
+        the modification time of its file, so processes sharing the directory see models
+        of each other and model files of any process are removed by the limit. The index keeps
+        only hashes of files, it is merged with the index on disk before it is written.
+
+    Attributes:
+        _directory: Directory of the cache.
+        _max_bytes: Size limit of the cache.
+        _index_name: Name of the JSON file with the index.
+        _index: A dict with 'files' (name: [mtime, size, hash]).
+        _stats: A dict with hits, misses and evictions since the start.
+    """
+
+    def __init__(self, directory, max_bytes):
+        """Inits the cache instance."""
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._index_name = os.path.join(directory, 'index.json')
+        self._stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        self._index = {'files': self._load_files()}
+
+    def _load_files(self):
+        """Returns hashes of files of the index on disk."""
+        try:
+            with open(self._index_name) as file:
+                return dict(json.load(file).get('files', {}))
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _save_index(self):
+        """Merges the index with the index on disk and writes it, replacing it at once."""
+        os.makedirs(self._directory, exist_ok=True)
+        self._index['files'] = dict(self._load_files(), **self._index['files'])
+        temporary = '%s.%d.tmp' % (self._index_name, os.getpid())
+        with open(temporary, 'w') as file:
+            json.dump(self._index, file)
+        os.replace(temporary, self._index_name)
+
+    def _hash_file(self, file_name):
+        """Returns the hash of the content of the file, computed again only if the file was changed."""
+        file_name = os.path.abspath(file_name)
+        status = os.stat(file_name)
+        known = self._index['files'].get(file_name)
+        if known is not None and known[:2] == [status.st_mtime_ns, status.st_size]:
+            return known[2]
+        digest = hashlib.blake2b()
+        with open(file_name, 'rb') as file:
+            for block in iter(lambda: file.read(_HASH_BLOCK_BYTES), b''):
+                digest.update(block)
+        self._index['files'][file_name] = [status.st_mtime_ns, status.st_size, digest.hexdigest()]
+        self._save_index()
+        return digest.hexdigest()
+
+    def _path(self, key):
+        """Returns the name of the model file of the key."""
+        return os.path.join(self._directory, key + '.nbcm')
+
+    def _entries(self):
+        """Returns a dict key: [size, last use] of model files in the directory."""
+        entries = {}
+        try:
+            names = os.listdir(self._directory)
+        except OSError:
+            return entries
+        for name in names:
+            if name.endswith('.nbcm'):
+                try:
+                    status = os.stat(os.path.join(self._directory, name))
+                except OSError:
+                    # Removed by another process meanwhile
+                    continue
+                entries[name[:-len('.nbcm')]] = [status.st_size, status.st_mtime]
+        return entries
+
+    def get_key(self, file_name, delimiter, algorithm):
+        """Returns the key of the model trained on the file."""
+        return hashlib.blake2b(json.dumps([self._hash_file(file_name), delimiter, algorithm]).encode('utf-8'),
+                               digest_size=16).hexdigest()
+
+    def get(self, key):
+        """Returns the name of the model file of the key or None."""
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            self._stats['misses'] += 1
+            return None
+        self._stats['hits'] += 1
+        return self._path(key)
+
+    def put(self, key, save):
+        """Saves a model with save(file_name) under the key and removes the least recently used models."""
+        os.makedirs(self._directory, exist_ok=True)
+        save(self._path(key))
+        entries = self._entries()
+        size = sum(entry[0] for entry in entries.values())
+        for old_key in sorted(entries, key=lambda k: entries[k][1]):
+            if size <= self._max_bytes:
+                break
+            if old_key == key:
+                continue
+            size -= entries[old_key][0]
+            try:
+                os.remove(self._path(old_key))
+            except FileNotFoundError:
+                continue
+            self._stats['evictions'] += 1
+
+    def get_stats(self):
+        """Returns a dict with hits, misses, evictions, entries and bytes."""
+        entries = self._entries()
+        return dict(self._stats, entries=len(entries), bytes=sum(entry[0] for entry in entries.values()))
+
+
+class _FileRange(io.RawIOBase):
+    """A read-only view of a byte range of an open binary file.
+
+    Attributes:
+        _file: The open binary file, positioned at the start of the range.
+        _left: Number of bytes left in the range.
+    """
+
+    def __init__(self, file, size):
+        """Inits the file range instance."""
+        io.RawIOBase.__init__(self)
+        self._file = file
+        self._left = size
+
+    def readable(self):
+        """Returns True, the range can be read."""
+        return True
+
+    def readinto(self, buffer):
+        """Reads bytes of the range into the buffer, returns their number."""
+        size = self._file.readinto(memoryview(buffer)[:min(len(buffer), self._left)])
+        self._left -= size
+        return size
+
+
+""" F U N C T I O N S:  #############################################################################################"""
+
+
+def nbc_train(file_name, delimiter, memory_budget=None, engine='c', buckets=0, algorithm='multinomial'):
+    """Returns the model (data.ModelNBC) trained on the file as InterfaceTrain.nbc_start_train.
+    An entry point of process pools of the message bus, it trains in a core of its own and keeps no state."""
+    interface_core = core.InterfaceCore(core.MODULES_HEADLESS, headless=True)
+    interface_data = interface_core.get_interface_data()
+    interface_data.set_train_file_name(file_name)
+    interface_core.get_interface_train().nbc_start_train(delimiter, memory_budget, engine=engine, buckets=buckets,
+                                                         algorithm=algorithm)
+    return interface_data.get_model_nbc()
+
+
+def _get_extension(file_name):
+    """Returns the lower case extension of the file name."""
+    return os.path.splitext(file_name)[1].lower()
+
+
+def _open_file(file_name):
+    """Returns a binary file object of the file, which decompresses it if the extension is of a compressed file."""
+    extension = _get_extension(file_name)
+    if extension == '.zst':
+        try:
+            import zstandard
+        except ImportError as error:
+            raise ImportError('The zstandard package is needed to read %s' % file_name) from error
+        return zstandard.open(file_name, 'rb')
+    return _DECOMPRESSORS.get(extension, open)(file_name, 'rb')
+
+
+def _count_columns(file_name, delimiter):
+    """Returns the number of columns in the first line of the file."""
+    with _open_file(file_name) as file:
+        return pandas.read_csv(file, sep=delimiter, header=None, nrows=1).shape[1]
+
+
+def _count_file(file, delimiter, n_columns, chunk_rows, report=None, engine='c', buckets=0, document_frequency=False):
+    """Returns counts of a binary file object, read in chunks of chunk_rows rows (None to read it at once).
+    Tokens are parsed straight into Python strings and only integer codes of them are counted.
+    report(rows) is called after every chunk, if it is given."""
+    reader = data.read_table(file, delimiter, n_columns, chunk_rows=chunk_rows, engine=engine)
+    if chunk_rows is None:
+        return _Counts.from_frame(reader, buckets, document_frequency)
+    counts = _Counts.empty(buckets, document_frequency)
+    rows = 0
+    with reader:
+        for chunk in reader:
+            counts.add(_Counts.from_frame(chunk, buckets, document_frequency))
+            rows += len(chunk)
+            if report is not None:
+                report(rows)
+    return counts
+
+
+def _count_pairs(pairs, cells):
+    """Returns sorted distinct codes of pairs (below cells) and the number of times each of them occurs."""
+    if cells <= _DENSE_CELLS_PER_PAIR * len(pairs):
+        counts = numpy.bincount(pairs, minlength=cells)
+        distinct = numpy.flatnonzero(counts)
+        return distinct, counts[distinct]
+    return numpy.unique(pairs, return_counts=True)
+
+
+def _shard_ranges(file_name, n_shards):
+    """Splits the file into byte ranges (start, end), which begin at line starts."""
+    size = os.path.getsize(file_name)
+    bounds = [0]
+    with open(file_name, 'rb') as file:
+        for i in range(1, n_shards):
+            position = size * i // n_shards
+            if not position:
+                # A file smaller than the number of shards has fewer shards
+                continue
+            file.seek(position - 1)
+            file.readline()
+            bounds.append(max(file.tell(), bounds[-1]))
+    bounds.append(size)
+    return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+def _count_shard(file_name, delimiter, start, end, n_columns, chunk_rows, engine='c', buckets=0,
+                 document_frequency=False):
+    """Returns counts of the byte range of the file. Runs in a worker process."""
+    with open(file_name, 'rb') as file:
+        file.seek(start)
+        return _count_file(io.BufferedReader(_FileRange(file, end - start)), delimiter, n_columns, chunk_rows, None,
+                           engine, buckets, document_frequency)
+
+
+def _merge_counts(left, right):
+    """Returns left counts with right counts added. Runs in a worker process."""
+    left.add(right)
+    return left
+
+
+def _sample_lines(file_name, seed=0):
+    """Returns the size of the file in bytes (None if it is compressed), lines of its head and
+    whole lines at random offsets. A plain file is mapped into memory, so only the sampled pages are read."""
+    if _get_extension(file_name) in _COMPRESSED_EXTENSIONS:
+        with _open_file(file_name) as file:
+            head = file.read(_SAMPLE_BYTES)
+        size = None
+        if _get_extension(file_name) == '.gz' and os.path.getsize(file_name) >= 4:
+            # The last 4 bytes of a gzip member are the size of its content modulo 2**32
+            with open(file_name, 'rb') as file:
+                file.seek(-4, os.SEEK_END)
+                size = int.from_bytes(file.read(4), 'little')
+            if size < len(head):
+                size = None
+        return size, head.split(b'\n')[:-1] if b'\n' in head else [head], []
+    size = os.path.getsize(file_name)
+    if not size:
+        return 0, [], []
+    with open(file_name, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        head = mapped[:_SAMPLE_BYTES]
+        head_lines = head.split(b'\n')
+        if len(head) < size:
+            head_lines = head_lines[:-1]
+        probes = []
+        if size > _SAMPLE_BYTES:
+            offsets = numpy.random.default_rng(seed).integers(_SAMPLE_BYTES, size, _PREFLIGHT_PROBES)
+            for offset in numpy.sort(offsets).tolist():
+                lines = mapped[offset:offset + _PREFLIGHT_PROBE_BYTES].split(b'\n')
+                # The first piece is the end of a line, the last one is whole only at the end of the file
+                probes += lines[1:] if offset + _PREFLIGHT_PROBE_BYTES >= size else lines[1:-1]
+    return size, head_lines, probes
+
+
+def _preflight(file_name, delimiter=None):
+    """Returns the preflight report of the file, see InterfaceTrain.nbc_preflight."""
+    size, head_lines, probe_lines = _sample_lines(file_name)
+    lines = [line.rstrip(b'\r') for line in head_lines + probe_lines]
+    lines = [line for line in lines if line]
+    report = {'delimiter': delimiter, 'columns': 0, 'sampled_lines': len(lines), 'bad_lines': 0, 'rows': None,
+              'classes': 0, 'vocabulary': 0, 'train_seconds': None, 'memory_bytes': None, 'problems': []}
+    if not lines:
+        report['problems'].append('The file is empty')
+        return report
+    sample = b'\n'.join(lines)
+    if b'\0' in sample:
+        report['problems'].append('The file is binary')
+        return report
+    try:
+        text_lines = sample.decode('utf-8').split('\n')
+    except UnicodeDecodeError:
+        report['problems'].append('The file is not UTF-8 text')
+        return report
+
+    # The delimiter splits most lines into the same number of columns, more than one
+    if delimiter is None:
+        best = None
+        for candidate in _DELIMITERS:
+            counts = numpy.array([line.count(candidate) for line in text_lines])
+            mode = numpy.bincount(counts).argmax()
+            score = (mode > 0, int(numpy.count_nonzero(counts == mode)), mode)
+            if best is None or score > best[0]:
+                best = score, candidate
+        delimiter = best[1] if best[0][0] else None
+        report['delimiter'] = delimiter
+        if delimiter is None:
+            report['problems'].append('No delimiter found, the file has one column')
+            return report
+    rows = [line.split(delimiter) for line in text_lines]
+    widths = numpy.array([len(row) for row in rows])
+    columns = int(numpy.bincount(widths).argmax())
+    report['columns'] = columns
+    report['bad_lines'] = int(numpy.count_nonzero(widths != columns))
+    if report['bad_lines']:
+        report['problems'].append('%d of %d sampled lines do not have %d columns' % (report['bad_lines'], len(lines),
+                                                                                 columns))
+    if columns < 2:
+        report['problems'].append('A row needs a label and at least one token')
+        return report
+
+    # Rows are estimated from the mean length of sampled lines, distinct tokens by the Chao1 estimator,
+    # which is a lower bound: tokens seen once and twice in the sample tell how many were not seen
+    if size is not None:
+        report['rows'] = int(size / (len(sample) + 1) * len(lines))
+    report['classes'] = len({row[0] for row in rows})
+    frequencies = numpy.bincount(numpy.unique([token for row in rows for token in row[1:]], return_counts=True)[1])
+    seen, once, twice = int(frequencies.sum()), int(frequencies[1:2].sum()), int(frequencies[2:3].sum())
+    total = (report['rows'] or len(lines)) * (columns - 1)
+    report['vocabulary'] = int(min(seen + once * (once - 1) / (2 * (twice + 1)), total))
+    if report['rows'] is not None:
+        report['train_seconds'] = report['rows'] * columns / _CELLS_PER_SECOND
+        # Counts take a key and a count for every pair of a class and a token, which occurs
+        pairs = min(report['classes'] * report['vocabulary'], report['rows'] * (columns - 1))
+        report['memory_bytes'] = report['rows'] * columns * _CELL_BYTES + pairs * 16
+    return report
+
+
+def _collision_report(model, buckets):
+    """Returns the collision report of hashing tokens of the model into buckets."""
+    bucket_of = model.hash_tokens(model.tokens, buckets)
+    tokens_per_bucket = numpy.bincount(bucket_of, minlength=buckets)
+    colliding = tokens_per_bucket[bucket_of] > 1
+    occurrences = model.w_c.sum(axis=0)
+    pairs, positions = numpy.unique(model.w_c.get_rows() * buckets + bucket_of[model.w_c.indices], return_inverse=True)
+    hashed = data.CountMatrix.from_rows((len(model.labels), buckets), pairs // buckets, pairs % buckets,
+                                        numpy.bincount(positions, weights=model.w_c.data).astype(numpy.int64))
+    return {'tokens': len(bucket_of), 'buckets': buckets,
+            'used_buckets': int(numpy.count_nonzero(tokens_per_bucket)),
+            'colliding_tokens': int(numpy.count_nonzero(colliding)),
+            'collision_rate': float(numpy.count_nonzero(colliding) / len(bucket_of)) if len(bucket_of) else 0.0,
+            'colliding_occurrences_share': float(occurrences[colliding].sum() / occurrences.sum())
+            if occurrences.sum() else 0.0,
+            'exact_bytes': int(model.w_c.nbytes), 'hashed_bytes': int(hashed.nbytes)}
 
 
 """ E N D   O F   F I L E.  #########################################################################################"""
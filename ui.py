@@ -2,12 +2,13 @@
 
 
 import core
+import data
 import PyQt5.QtWidgets
 import PyQt5.QtCore
 import PyQt5.QtGui
-import threading
+import numpy
 import os
-import subprocess
+import threading
 import time
 
 
@@ -43,6 +44,17 @@ class InterfaceUI:
         self._main_module_object.start_ui()
 
 
+""" C O N S T A N T S:  #############################################################################################"""
+
+
+# Rows of the model browser, which are fetched at once while the table is scrolled.
+_FETCH_ROWS = 1024
+
+# Memory in bytes for chunks of the training file, training streams the file so it shows progress
+# and can be cancelled after every chunk.
+_TRAIN_MEMORY_BUDGET = 128 << 20
+
+
 """ M A I N   C L A S S:  ###########################################################################################"""
 
 
@@ -99,6 +111,7 @@ class _MyTabWidget(PyQt5.QtWidgets.QWidget):
         tabs: An instance of the tab Qt widget.
         trn_...: Widgets on the 'Train' tab.
         fpga_...: Widgets on the 'FPGA' tab.
+        prf_...: Widgets on the 'Profile' tab.
     """
 
     def __init__(self, interface_core):
@@ -112,6 +125,7 @@ class _MyTabWidget(PyQt5.QtWidgets.QWidget):
         self.interface_core = interface_core
         self.interface_data = interface_core.get_interface_data()
         self.interface_train = interface_core.get_interface_train()
+        self.interface_fpga = interface_core.get_interface_by_name('fpga')
         self.palette = PyQt5.QtGui.QPalette()
         #################################
         # Initialization of 'info' tab: #
@@ -135,13 +149,35 @@ class _MyTabWidget(PyQt5.QtWidgets.QWidget):
         self.trn_btn_start =            PyQt5.QtWidgets.QPushButton('Start training...', self)
         self.trn_label_delim =          PyQt5.QtWidgets.QLabel('Delimiter:')
         self.trn_label_training =       PyQt5.QtWidgets.QLabel('Please wait. Training...')
+        self.trn_btn_cancel =           PyQt5.QtWidgets.QPushButton('Cancel', self)
+        self.trn_timer =                PyQt5.QtCore.QTimer(self)
         self.trn_btn_show_model =       PyQt5.QtWidgets.QPushButton('Show model...', self)
         self.trn_label_status =         PyQt5.QtWidgets.QLabel('Status:')
         self.trn_line_status =          PyQt5.QtWidgets.QLineEdit(self)
+        self.trn_label_preflight =      PyQt5.QtWidgets.QLabel('')
         #################################
         # Initialization of 'fpga' tab: #
         #################################
         self.fpga_tab =                 PyQt5.QtWidgets.QWidget()
+        self.fpga_tab.layout =          PyQt5.QtWidgets.QGridLayout()
+        self.fpga_label_width =         PyQt5.QtWidgets.QLabel('Word width:')
+        self.fpga_combobox_width =      PyQt5.QtWidgets.QComboBox()
+        self.fpga_btn_export =          PyQt5.QtWidgets.QPushButton('Export model...', self)
+        self.fpga_btn_emulate =         PyQt5.QtWidgets.QPushButton('Emulate...', self)
+        self.fpga_label_status =        PyQt5.QtWidgets.QLabel('Status:')
+        self.fpga_line_status =         PyQt5.QtWidgets.QLineEdit(self)
+        self.fpga_label_spacer =        PyQt5.QtWidgets.QLabel('')
+        ####################################
+        # Initialization of 'profile' tab: #
+        ####################################
+        self.prf_tab =                  PyQt5.QtWidgets.QWidget()
+        self.prf_tab.layout =           PyQt5.QtWidgets.QGridLayout()
+        self.prf_checkbox_enable =      PyQt5.QtWidgets.QCheckBox('Profiling', self)
+        self.prf_checkbox_memory =      PyQt5.QtWidgets.QCheckBox('Trace memory', self)
+        self.prf_btn_refresh =          PyQt5.QtWidgets.QPushButton('Refresh', self)
+        self.prf_btn_clear =            PyQt5.QtWidgets.QPushButton('Clear', self)
+        self.prf_btn_export =           PyQt5.QtWidgets.QPushButton('Export...', self)
+        self.prf_table =                PyQt5.QtWidgets.QTableWidget(0, 7, self)
 
         #############
         # Settings: #
@@ -152,8 +188,10 @@ class _MyTabWidget(PyQt5.QtWidgets.QWidget):
         ############################
         # Settings of 'train' tab: #
         ############################
-        self.trn_combobox_alg.addItems(['Naive bayesian classifier', 'Other1', 'Other2'])
+        for algorithm, (title, _) in data.ALGORITHM_REGISTRY.items():
+            self.trn_combobox_alg.addItem(title, algorithm)
         self.trn_combobox_alg.setToolTip(self.trn_combobox_alg.currentText())
+        self.trn_combobox_alg.currentTextChanged.connect(self.trn_combobox_alg.setToolTip)
         self.trn_combobox_frmt.addItems(['.csv', '.tsv', '.scsv'])
         self.trn_combobox_delim.addItems([',', ';', '\\t'])
         self.trn_btn_choose.setToolTip('Choose training data...')
@@ -172,6 +210,42 @@ class _MyTabWidget(PyQt5.QtWidgets.QWidget):
         self.trn_line_status.setText('Choosing train data...')
         self.trn_line_status.setPalette(self.palette)
         self.trn_label_training.setVisible(False)
+        self.trn_btn_cancel.setVisible(False)
+        self.trn_btn_cancel.clicked.connect(self.cancel_training)
+        self.trn_timer.setInterval(200)
+        self.trn_timer.timeout.connect(self.show_training_time)
+        ###########################
+        # Settings of 'fpga' tab: #
+        ###########################
+        self.fpga_tab.setLayout(self.fpga_tab.layout)
+        self.fpga_tab.layout.setSpacing(10)
+        self.fpga_combobox_width.addItems(['8', '16', '32'])
+        self.fpga_combobox_width.setCurrentText('16')
+        self.fpga_combobox_width.setMaximumWidth(70)
+        self.fpga_btn_export.setToolTip('Write fixed-point memory images of the model...')
+        self.fpga_btn_export.clicked.connect(self.export_model)
+        self.fpga_btn_export.setDisabled(True)
+        self.fpga_btn_emulate.setToolTip('Classify labeled data with the emulated datapath...')
+        self.fpga_btn_emulate.clicked.connect(self.emulate_model)
+        self.fpga_btn_emulate.setDisabled(True)
+        self.fpga_line_status.setDisabled(True)
+        self.fpga_line_status.setText('Waiting for model...')
+        ##############################
+        # Settings of 'profile' tab: #
+        ##############################
+        self.prf_tab.setLayout(self.prf_tab.layout)
+        self.prf_tab.layout.setSpacing(10)
+        self.prf_checkbox_enable.toggled.connect(self.switch_profiling)
+        self.prf_checkbox_memory.setToolTip('Trace peaks of allocated memory, it makes the program slower')
+        self.prf_checkbox_memory.toggled.connect(self.switch_profiling)
+        self.prf_btn_refresh.clicked.connect(self.show_profile)
+        self.prf_btn_clear.clicked.connect(self.clear_profile)
+        self.prf_btn_export.setToolTip('Write the profile to JSON or Chrome trace file...')
+        self.prf_btn_export.clicked.connect(self.export_profile)
+        self.prf_table.setHorizontalHeaderLabels(['Span', 'Calls', 'Wall, s', 'CPU, s', 'Rows', 'Rows/s',
+                                                  'Peak, MB'])
+        self.prf_table.setEditTriggers(PyQt5.QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.prf_table.verticalHeader().setVisible(False)
 
         ###################
         # Adding widgets: #
@@ -179,6 +253,7 @@ class _MyTabWidget(PyQt5.QtWidgets.QWidget):
         self.tabs.addTab(self.info_tab, 'Info')
         self.tabs.addTab(self.trn_tab, 'Training')
         self.tabs.addTab(self.fpga_tab, 'FPGA')
+        self.tabs.addTab(self.prf_tab, 'Profile')
         self.layout.addWidget(self.tabs)
         ##################################
         # Adding widgets on 'train' tab: #
@@ -195,13 +270,34 @@ class _MyTabWidget(PyQt5.QtWidgets.QWidget):
         self.trn_tab.layout.addWidget(self.trn_btn_choose, 2, 1)
         self.trn_tab.layout.addWidget(self.trn_line_choose, 2, 2, 1, 2)
         self.trn_tab.layout.addWidget(self.trn_btn_start, 3, 0)
-        self.trn_tab.layout.addWidget(self.trn_label_training, 3, 1)
+        self.trn_tab.layout.addWidget(self.trn_label_training, 3, 1, 1, 2)
+        self.trn_tab.layout.addWidget(self.trn_btn_cancel, 3, 3)
         self.trn_tab.layout.addWidget(self.trn_btn_show_model, 4, 0)
+        self.trn_tab.layout.addWidget(self.trn_label_preflight, 4, 1, 1, 3)
         self.trn_tab.layout.addWidget(self.trn_label_spacer, 5, 0, 6, 1)
+        #################################
+        # Adding widgets on 'fpga' tab: #
+        #################################
+        self.fpga_tab.layout.addWidget(self.fpga_label_width, 0, 0)
+        self.fpga_tab.layout.addWidget(self.fpga_label_status, 0, 1)
+        self.fpga_tab.layout.addWidget(self.fpga_combobox_width, 1, 0)
+        self.fpga_tab.layout.addWidget(self.fpga_line_status, 1, 1, 1, 2)
+        self.fpga_tab.layout.addWidget(self.fpga_btn_export, 2, 0)
+        self.fpga_tab.layout.addWidget(self.fpga_btn_emulate, 2, 1)
+        self.fpga_tab.layout.addWidget(self.fpga_label_spacer, 3, 0, 6, 1)
+        ####################################
+        # Adding widgets on 'profile' tab: #
+        ####################################
+        self.prf_tab.layout.addWidget(self.prf_checkbox_enable, 0, 0)
+        self.prf_tab.layout.addWidget(self.prf_checkbox_memory, 0, 1)
+        self.prf_tab.layout.addWidget(self.prf_btn_refresh, 0, 2)
+        self.prf_tab.layout.addWidget(self.prf_btn_clear, 0, 3)
+        self.prf_tab.layout.addWidget(self.prf_btn_export, 0, 4)
+        self.prf_tab.layout.addWidget(self.prf_table, 1, 0, 1, 5)
 
     @PyQt5.QtCore.pyqtSlot()
     def start_training(self):
-        """Starts training model."""
+        """Starts training model in the background thread."""
 
         # Changing delimiter in case of tabulation
         delim = self.trn_combobox_delim.currentText()
@@ -214,50 +310,171 @@ class _MyTabWidget(PyQt5.QtWidgets.QWidget):
         self.palette.setColor(PyQt5.QtGui.QPalette.Text, PyQt5.QtCore.Qt.red)
         self.trn_line_status.setPalette(self.palette)
         self.trn_btn_show_model.setDisabled(True)
+        self.trn_label_training.setText('Please wait. Training...')
         self.trn_label_training.setVisible(True)
-        self.trn_btn_show_model.repaint()
-        self.trn_btn_start.repaint()
-        self.trn_label_training.repaint()
+        self.trn_btn_cancel.setDisabled(False)
+        self.trn_btn_cancel.setVisible(True)
+
+        # Starting the training thread and the timer of the elapsed time
+        self.trn_phase, self.trn_rows, self.trn_start_time = 'reading', 0, time.monotonic()
+        self.trn_thread = _TrainingThread(self.interface_train, delim, self.trn_combobox_alg.currentData(),
+                                          _TRAIN_MEMORY_BUDGET)
+        self.trn_thread.progress.connect(self.show_training_progress)
+        self.trn_thread.succeeded.connect(self.finish_training)
+        self.trn_thread.stopped.connect(self.stop_training)
+        self.trn_thread.start()
+        self.trn_timer.start()
 
-        #####################################
-        # CALLING METHOD FROM OTHER MODULE! #
-        self.interface_train.nbc_start_train(delim)
-        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
-        #####################################
+    @PyQt5.QtCore.pyqtSlot()
+    def cancel_training(self):
+        """Asks the training thread to stop."""
+        self.trn_btn_cancel.setDisabled(True)
+        self.trn_label_training.setText('Cancelling...')
+        self.trn_thread.cancel()
+
+    @PyQt5.QtCore.pyqtSlot(str, int)
+    def show_training_progress(self, phase, rows):
+        """Saves the phase of training and the number of rows counted so far."""
+        self.trn_phase, self.trn_rows = phase, rows
+        self.show_training_time()
 
-        time.sleep(1)
-        # Settings for widgets when the training is over
+    @PyQt5.QtCore.pyqtSlot()
+    def show_training_time(self):
+        """Shows the phase of training, the elapsed time and the speed."""
+        elapsed = time.monotonic() - self.trn_start_time
+        self.trn_label_training.setText('%s: %.1f s, %d rows/s' % (self.trn_phase.capitalize(), elapsed,
+                                                                    self.trn_rows / elapsed if elapsed else 0))
+
+    def _hide_training_progress(self):
+        """Sets widgets of the training progress when the training thread is over, returns the elapsed time."""
+        self.trn_timer.stop()
         self.trn_label_training.setVisible(False)
+        self.trn_btn_cancel.setVisible(False)
         self.trn_btn_start.setDisabled(False)
+        return time.monotonic() - self.trn_start_time
+
+    @PyQt5.QtCore.pyqtSlot()
+    def finish_training(self):
+        """Sets widgets when the model is ready."""
+        elapsed = self._hide_training_progress()
         self.trn_btn_show_model.setDisabled(False)
-        self.trn_line_status.setText('Model is ready!')
+        self.trn_line_status.setText('Model is ready! %.1f s, %d rows/s' % (elapsed, self.trn_rows / elapsed))
         self.palette.setColor(PyQt5.QtGui.QPalette.Text, PyQt5.QtCore.Qt.green)
         self.trn_line_status.setPalette(self.palette)
+        self.fpga_btn_export.setDisabled(False)
+        self.fpga_btn_emulate.setDisabled(False)
+        self.fpga_line_status.setText('Ready for export...')
+
+    @PyQt5.QtCore.pyqtSlot(str, str)
+    def stop_training(self, status, error):
+        """Sets widgets when the training is cancelled or failed."""
+        self._hide_training_progress()
+        self.trn_line_status.setText(status)
+        if error:
+            self.interface_core.show_error(error)
 
     @PyQt5.QtCore.pyqtSlot()
     def show_model(self):
         """Shows new window with information about model."""
 
-        # Opening file and get path
-        file = open('model_data.txt', 'w')
-        path = os.path.abspath('model_data.txt')
+        #####################################
+        # CALLING METHOD FROM OTHER MODULE! #
+        model = self.interface_data.get_model_nbc()
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+        #####################################
+
+        # The browser reads the model arrays, so it opens at once for any size of vocabulary
+        self.trn_browser = _ModelBrowser(model, self)
+        self.trn_browser.show()
+
+    @PyQt5.QtCore.pyqtSlot()
+    def export_model(self):
+        """Writes fixed-point memory images of the model to the chosen directory."""
+
+        # Calling directory dialog widget in new window
+        opt = PyQt5.QtWidgets.QFileDialog.Options()
+        opt |= PyQt5.QtWidgets.QFileDialog.DontUseNativeDialog
+        directory = PyQt5.QtWidgets.QFileDialog.getExistingDirectory(self, "Choose export directory...", "",
+                                                                     options=opt)
+        if not directory:
+            return
+
+        #####################################
+        # CALLING METHOD FROM OTHER MODULE! #
+        self.interface_fpga.nbc_quantize(int(self.fpga_combobox_width.currentText()))
+        files = self.interface_fpga.nbc_export(directory)
+        # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+        #####################################
+
+        self.fpga_line_status.setText('Exported %d files to %s' % (len(files), directory))
+
+    @PyQt5.QtCore.pyqtSlot()
+    def emulate_model(self):
+        """Classifies the chosen labeled file with the emulated FPGA datapath and shows the accuracy."""
+
+        # Calling file dialog widget in new window
+        opt = PyQt5.QtWidgets.QFileDialog.Options()
+        opt |= PyQt5.QtWidgets.QFileDialog.DontUseNativeDialog
+        filt = '*%s' % self.trn_combobox_frmt.currentText()
+        file_name, _ = PyQt5.QtWidgets.QFileDialog.getOpenFileName(self, "Choose test data...", "",
+                                                                   filt, options=opt)
+        if not file_name:
+            return
+
+        # Changing delimiter in case of tabulation
+        delim = self.trn_combobox_delim.currentText()
+        if delim == '\\t':
+            delim = '\t'
 
         #####################################
         # CALLING METHOD FROM OTHER MODULE! #
-        model = self.interface_data.get_ready_model_nbc()
+        self.interface_fpga.nbc_quantize(int(self.fpga_combobox_width.currentText()))
+        report = self.interface_fpga.nbc_emulate(file_name, delim)
         # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
         #####################################
 
-        # Writing
-        file.write('v = %s\n' % model['v'])
-        for i in range(0, len(model['d_c'])):
-            file.write('\nd_%d = %s' % (i, str(model['d_c'][i])))
-            file.write('\nl_%d = %s' % (i, str(model['l_c'][i])))
-            file.write('\nw_%d = %s\n' % (i, str(model['w_c'][i])))
-        file.close()
+        self.fpga_line_status.setText('Fixed: %.2f%%, float: %.2f%%, agree: %.2f%%, %d rows/s'
+                                      % (100 * report['accuracy_fixed'], 100 * report['accuracy_float'],
+                                         100 * report['agreement'], report['rows_per_second']))
+        self.fpga_line_status.setToolTip(str(report))
+
+    @PyQt5.QtCore.pyqtSlot()
+    def switch_profiling(self):
+        """Turns the profiler on or off as set by the check boxes."""
+        self.interface_core.disable_profiling()
+        if self.prf_checkbox_enable.isChecked():
+            self.interface_core.enable_profiling(self.prf_checkbox_memory.isChecked())
+
+    @PyQt5.QtCore.pyqtSlot()
+    def show_profile(self):
+        """Shows recorded spans summed up by name in the table."""
+        profile = self.interface_core.get_profile()
+        self.prf_table.setRowCount(len(profile))
+        for row, item in enumerate(profile):
+            cells = [item['name'], '%d' % item['calls'], '%.4f' % item['wall'], '%.4f' % item['cpu'],
+                     '%d' % item['rows'], '%.0f' % item['rows_per_second'], '%.1f' % (item['peak_bytes'] / 2 ** 20)]
+            for column, text in enumerate(cells):
+                self.prf_table.setItem(row, column, PyQt5.QtWidgets.QTableWidgetItem(text))
+        self.prf_table.resizeColumnsToContents()
 
-        # Open file with 'gedit'
-        subprocess.call(["gedit", path])
+    @PyQt5.QtCore.pyqtSlot()
+    def clear_profile(self):
+        """Removes recorded spans."""
+        self.interface_core.clear_profile()
+        self.show_profile()
+
+    @PyQt5.QtCore.pyqtSlot()
+    def export_profile(self):
+        """Writes recorded spans to the chosen file."""
+
+        # Calling file dialog widget in new window
+        opt = PyQt5.QtWidgets.QFileDialog.Options()
+        opt |= PyQt5.QtWidgets.QFileDialog.DontUseNativeDialog
+        file_name, filt = PyQt5.QtWidgets.QFileDialog.getSaveFileName(self, "Export profile...", "profile.json",
+                                                                      "Profile (*.json);;Chrome trace (*.json)",
+                                                                      options=opt)
+        if file_name:
+            self.interface_core.export_profile(file_name, filt.startswith('Chrome'))
 
     @PyQt5.QtCore.pyqtSlot()
     def show_file_dialog(self):
@@ -278,7 +495,8 @@ class _MyTabWidget(PyQt5.QtWidgets.QWidget):
 
     @PyQt5.QtCore.pyqtSlot()
     def check_line_choose(self):
-        """Checks selected file, changes color of the text and set train file name in data module"""
+        """Checks selected file, changes color of the text and set train file name in data module.
+        The file is checked by the preflight of the train module, which detects the delimiter."""
 
         # Get train file name from the choose line
         text = self.trn_line_choose.text()
@@ -286,8 +504,22 @@ class _MyTabWidget(PyQt5.QtWidgets.QWidget):
         # Init palette for changing color
         palette = PyQt5.QtGui.QPalette()
 
-        # Checking file name
-        if text is not None:
+        # Checking file name and sampled lines of the file
+        report, problems = None, ['Cannot open file']
+        if text and os.path.isfile(text):
+            try:
+
+                #####################################
+                # CALLING METHOD FROM OTHER MODULE! #
+                report = self.interface_train.nbc_preflight(text)
+                # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+                #####################################
+
+            except (OSError, ImportError) as error:
+                problems = [str(error)]
+            else:
+                problems = report['problems']
+        if not problems:
 
             # If file name is OK - widgets settings
             self.trn_btn_start.setDisabled(False)
@@ -298,6 +530,21 @@ class _MyTabWidget(PyQt5.QtWidgets.QWidget):
             self.trn_line_status.setPalette(self.palette)
             self.trn_line_status.setText('Ready for training...')
 
+            # Setting the detected delimiter and showing estimates
+            delim = '\\t' if report['delimiter'] == '\t' else report['delimiter']
+            if self.trn_combobox_delim.findText(delim) < 0:
+                self.trn_combobox_delim.addItem(delim)
+            self.trn_combobox_delim.setCurrentText(delim)
+            if report['rows'] is None:
+                self.trn_label_preflight.setText('%d columns, %d classes, rows unknown' % (report['columns'],
+                                                                                          report['classes']))
+            else:
+                self.trn_label_preflight.setText('~%d rows, %d columns, %d classes, >=%d tokens, ~%.1f s, ~%.0f MB'
+                                                 % (report['rows'], report['columns'], report['classes'],
+                                                    report['vocabulary'], report['train_seconds'],
+                                                    report['memory_bytes'] / 2 ** 20))
+            self.trn_label_preflight.setToolTip('Estimated from %d sampled lines' % report['sampled_lines'])
+
             #####################################
             # CALLING METHOD FROM OTHER MODULE! #
             self.interface_data.set_train_file_name(text)
@@ -311,10 +558,12 @@ class _MyTabWidget(PyQt5.QtWidgets.QWidget):
             self.trn_btn_show_model.setDisabled(True)
             palette.setColor(PyQt5.QtGui.QPalette.Text, PyQt5.QtCore.Qt.red)
             self.trn_line_choose.setPalette(palette)
-            self.trn_line_choose.setToolTip('Cannot open file')
+            self.trn_line_choose.setToolTip('; '.join(problems))
             self.palette.setColor(PyQt5.QtGui.QPalette.Text, PyQt5.QtCore.Qt.red)
             self.trn_line_status.setPalette(self.palette)
             self.trn_line_status.setText('Choosing train data...')
+            self.trn_label_preflight.setText(problems[0])
+            self.trn_label_preflight.setToolTip('\n'.join(problems))
 
     @PyQt5.QtCore.pyqtSlot()
     def auto_set_delimiter(self):
@@ -323,4 +572,324 @@ class _MyTabWidget(PyQt5.QtWidgets.QWidget):
         self.trn_combobox_delim.setCurrentText(d[self.trn_combobox_frmt.currentText()])
 
 
+class _TrainingThread(PyQt5.QtCore.QThread):
+    """The class of the thread, which trains the model.
+
+    The thread calls the train module and sends signals to the main widget,
+        so the GUI is not blocked during the training.
+
+    Attributes:
+        progress: A signal (phase, rows) for every phase and chunk of training.
+        succeeded: A signal sent when the model is ready.
+        stopped: A signal (status, error) sent when the training is cancelled or failed.
+        interface_train: An instance of the train interface.
+        delimiter: Delimiter of the training data file.
+        algorithm: Name of the algorithm in the train module.
+        memory_budget: Memory in bytes for chunks of the file, None to read the file at once.
+        cancel_event: An event, which stops the training.
+    """
+
+    progress = PyQt5.QtCore.pyqtSignal(str, int)
+    succeeded = PyQt5.QtCore.pyqtSignal()
+    stopped = PyQt5.QtCore.pyqtSignal(str, str)
+
+    def __init__(self, interface_train, delimiter, algorithm='multinomial', memory_budget=None):
+        """Inits the thread instance."""
+        PyQt5.QtCore.QThread.__init__(self)
+        self.interface_train = interface_train
+        self.delimiter = delimiter
+        self.algorithm = algorithm
+        self.memory_budget = memory_budget
+        self.cancel_event = threading.Event()
+
+    def cancel(self):
+        """Asks the training to stop after the current phase or chunk."""
+        self.cancel_event.set()
+
+    def run(self):
+        """Trains the model."""
+        try:
+
+            #####################################
+            # CALLING METHOD FROM OTHER MODULE! #
+            self.interface_train.nbc_start_train(self.delimiter, self.memory_budget, progress=self.progress.emit,
+                                                 cancel=self.cancel_event, algorithm=self.algorithm)
+            # !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!! #
+            #####################################
+
+        except Exception as error:
+            if self.cancel_event.is_set():
+                self.stopped.emit('Training cancelled!', '')
+            else:
+                self.stopped.emit('Training failed!', str(error))
+        else:
+            self.succeeded.emit()
+
+
+class _ModelTableModel(PyQt5.QtCore.QAbstractTableModel):
+    """The class of the table of the model browser.
+
+    Rows are tokens of the model. Columns are the token, its count in all classes, its count
+        and its log-likelihood log((w_c+1)/(v+l_c)) in the chosen class. Counts of a Bernoulli model
+        are numbers of rows with the token and its log-likelihood is log((w_c+1)/(d_c+2)). A Complement model
+        adds -log((n+1)/(v+m)), n and m are occurrences of the token and of all tokens in other classes,
+        see _LOG_LIKELIHOODS. Cells are read from
+        the model arrays only when the view draws them and rows are fetched in blocks while
+        the view is scrolled, so the table opens at once for any size of vocabulary.
+        Sorting, top-k and search replace the array of shown columns of w_c.
+
+    Attributes:
+        _model: The NBC model, see data.ModelNBC.
+        _headers: Titles of the columns.
+        _class: Row of w_c of the chosen class.
+        _counts: Dense array with the row of w_c of the chosen class.
+        _totals: Dense array with sums of columns of w_c.
+        _columns: Numpy array with shown columns of w_c in their order or None for all columns of w_c.
+        _size: Number of shown rows.
+        _fetched: Number of rows fetched by the view.
+    """
+
+    def __init__(self, model, parent=None):
+        """Inits the table instance."""
+        PyQt5.QtCore.QAbstractTableModel.__init__(self, parent)
+        self._model = model
+        self._headers = ['Bucket' if model.buckets else 'Token', 'Total',
+                         'Rows' if data.ALGORITHM_REGISTRY[model.algorithm][1] == 'df_c' else 'Count',
+                         'Log-likelihood']
+        self._class = 0
+        self._counts = model.w_c.get_row(0) if len(model.labels) else numpy.zeros(0, dtype=numpy.int64)
+        self._totals = model.w_c.sum(axis=0)
+        self._columns = None
+        self._size = model.w_c.shape[1]
+        self._fetched = min(self._size, _FETCH_ROWS)
+
+    def rowCount(self, parent=PyQt5.QtCore.QModelIndex()):
+        """Returns the number of fetched rows."""
+        return 0 if parent.isValid() else self._fetched
+
+    def columnCount(self, parent=PyQt5.QtCore.QModelIndex()):
+        """Returns the number of columns."""
+        return 0 if parent.isValid() else len(self._headers)
+
+    def canFetchMore(self, parent):
+        """Returns True if some shown rows are not fetched yet."""
+        return not parent.isValid() and self._fetched < self._size
+
+    def fetchMore(self, parent):
+        """Fetches the next block of rows."""
+        count = min(_FETCH_ROWS, self._size - self._fetched)
+        self.beginInsertRows(PyQt5.QtCore.QModelIndex(), self._fetched, self._fetched + count - 1)
+        self._fetched += count
+        self.endInsertRows()
+
+    def data(self, index, role=PyQt5.QtCore.Qt.DisplayRole):
+        """Returns the text or the alignment of the cell."""
+        if not index.isValid():
+            return None
+        if role == PyQt5.QtCore.Qt.TextAlignmentRole and index.column():
+            return int(PyQt5.QtCore.Qt.AlignRight | PyQt5.QtCore.Qt.AlignVCenter)
+        if role != PyQt5.QtCore.Qt.DisplayRole:
+            return None
+        column = index.row() if self._columns is None else int(self._columns[index.row()])
+        if index.column() == 0:
+            return str(self._model.get_token(column))
+        if index.column() == 1:
+            return str(int(self._totals[column]))
+        if index.column() == 2:
+            return str(int(self._counts[column]))
+        return '%.4f' % self._get_log_likelihoods(numpy.array([column]))[0]
+
+    def _get_log_likelihoods(self, columns):
+        """Returns log-likelihoods of the columns of w_c in the chosen class."""
+        return _LOG_LIKELIHOODS[self._model.algorithm](self._model, self._class, self._counts[columns],
+                                                       self._totals[columns])
+
+    def headerData(self, section, orientation, role=PyQt5.QtCore.Qt.DisplayRole):
+        """Returns titles of the columns and numbers of the rows."""
+        if role != PyQt5.QtCore.Qt.DisplayRole:
+            return None
+        if orientation == PyQt5.QtCore.Qt.Horizontal:
+            return self._headers[section]
+        return str(section + 1)
+
+    def sort(self, column, order=PyQt5.QtCore.Qt.AscendingOrder):
+        """Sorts shown rows by the column, rows of w_c stay in their order if the column is negative."""
+        if column < 0:
+            return
+        columns = numpy.arange(self._size) if self._columns is None else self._columns
+        if column == 0:
+            keys = self._model.tokens[columns]
+        elif column == 1:
+            keys = self._totals[columns]
+        elif column == 2:
+            keys = self._counts[columns]
+        else:
+            keys = self._get_log_likelihoods(columns)
+        if order == PyQt5.QtCore.Qt.DescendingOrder:
+            columns = columns[::-1][numpy.argsort(keys[::-1], kind='stable')[::-1]]
+        else:
+            columns = columns[numpy.argsort(keys, kind='stable')]
+        self.layoutAboutToBeChanged.emit()
+        self._columns = columns
+        self.layoutChanged.emit()
+
+    def show_columns(self, columns):
+        """Shows the columns of w_c in their order, all columns if columns is None."""
+        self.beginResetModel()
+        self._columns = None if columns is None else numpy.asarray(columns, dtype=numpy.intp)
+        self._size = self._model.w_c.shape[1] if columns is None else len(self._columns)
+        self._fetched = min(self._size, _FETCH_ROWS)
+        self.endResetModel()
+
+    def set_class(self, row):
+        """Chooses the class of the last two columns by its row of w_c."""
+        self._class = row
+        self._counts = self._model.w_c.get_row(row)
+        if self._fetched:
+            self.dataChanged.emit(self.index(0, 2), self.index(self._fetched - 1, 3))
+
+    def get_top(self, k):
+        """Returns k columns of w_c with the largest counts in the chosen class, the largest first."""
+        counts = self._counts
+        k = min(k, len(counts))
+        if not k:
+            return numpy.empty(0, dtype=numpy.intp)
+        top = numpy.argpartition(-counts, k - 1)[:k]
+        return top[numpy.argsort(-counts[top], kind='stable')]
+
+    def find(self, text):
+        """Returns columns of w_c with tokens containing the text.
+        In the hashing mode it returns the bucket of the text, if the model has it."""
+        if self._model.buckets:
+            bucket = self._model.hash_tokens([text], self._model.buckets)[0]
+            return numpy.flatnonzero(self._model.tokens.astype(numpy.int64) == bucket)
+        return numpy.array([i for i, token in enumerate(self._model.tokens) if text in token], dtype=numpy.intp)
+
+    def get_size(self):
+        """Returns the number of shown rows."""
+        return self._size
+
+
+class _ModelBrowser(PyQt5.QtWidgets.QDialog):
+    """The class of the window of the model browser.
+
+    The window shows the model table with the chosen class, top-k tokens of the class
+        and tokens found by the search. Clicking the header of a column sorts the table.
+
+    Attributes:
+        layout: A layout of the window.
+        table_model: An instance of the model table.
+        ...: Widgets of the window.
+    """
+
+    def __init__(self, model, parent=None):
+        """Inits the window instance."""
+
+        ###################
+        # Initialization: #
+        ###################
+        PyQt5.QtWidgets.QDialog.__init__(self, parent)
+        self.layout =                   PyQt5.QtWidgets.QGridLayout(self)
+        self.table_model =              _ModelTableModel(model, self)
+        self.label_class =              PyQt5.QtWidgets.QLabel('Class:')
+        self.combobox_class =           PyQt5.QtWidgets.QComboBox()
+        self.label_search =             PyQt5.QtWidgets.QLabel('Search:')
+        self.line_search =              PyQt5.QtWidgets.QLineEdit(self)
+        self.spinbox_top =              PyQt5.QtWidgets.QSpinBox(self)
+        self.btn_top =                  PyQt5.QtWidgets.QPushButton('Show top', self)
+        self.btn_all =                  PyQt5.QtWidgets.QPushButton('Show all', self)
+        self.table =                    PyQt5.QtWidgets.QTableView(self)
+        self.label_status =             PyQt5.QtWidgets.QLabel('')
+
+        #############
+        # Settings: #
+        #############
+        self.setWindowTitle('Model: %d classes, %d tokens, v = %d' % (len(model.labels), model.w_c.shape[1],
+                                                                      model.v))
+        self.resize(600, 500)
+        self.combobox_class.addItems([str(label) for label in model.labels])
+        self.combobox_class.currentIndexChanged.connect(self.set_class)
+        self.line_search.setPlaceholderText('token')
+        self.line_search.returnPressed.connect(self.search)
+        self.spinbox_top.setRange(1, 1000000)
+        self.spinbox_top.setValue(100)
+        self.btn_top.clicked.connect(self.show_top)
+        self.btn_all.clicked.connect(self.show_all)
+        self.table.setModel(self.table_model)
+        self.table.horizontalHeader().setSortIndicator(-1, PyQt5.QtCore.Qt.DescendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.setEditTriggers(PyQt5.QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().setDefaultSectionSize(self.fontMetrics().height() + 4)
+        self.show_status()
+
+        ###################
+        # Adding widgets: #
+        ###################
+        self.layout.addWidget(self.label_class, 0, 0)
+        self.layout.addWidget(self.combobox_class, 0, 1)
+        self.layout.addWidget(self.label_search, 0, 2)
+        self.layout.addWidget(self.line_search, 0, 3)
+        self.layout.addWidget(self.spinbox_top, 1, 0)
+        self.layout.addWidget(self.btn_top, 1, 1)
+        self.layout.addWidget(self.btn_all, 1, 2)
+        self.layout.addWidget(self.label_status, 1, 3)
+        self.layout.addWidget(self.table, 2, 0, 1, 4)
+
+    def _show(self, columns):
+        """Shows the columns of w_c, the sort indicator is cleared because they are in their own order."""
+        self.table.horizontalHeader().setSortIndicator(-1, PyQt5.QtCore.Qt.DescendingOrder)
+        self.table_model.show_columns(columns)
+        self.show_status()
+
+    def show_status(self):
+        """Shows the number of shown tokens."""
+        self.label_status.setText('%d tokens' % self.table_model.get_size())
+
+    @PyQt5.QtCore.pyqtSlot(int)
+    def set_class(self, row):
+        """Shows counts of the chosen class."""
+        self.table_model.set_class(row)
+
+    @PyQt5.QtCore.pyqtSlot()
+    def show_top(self):
+        """Shows top-k tokens of the chosen class."""
+        self._show(self.table_model.get_top(self.spinbox_top.value()))
+
+    @PyQt5.QtCore.pyqtSlot()
+    def show_all(self):
+        """Shows all tokens in order of the model."""
+        self.line_search.clear()
+        self._show(None)
+
+    @PyQt5.QtCore.pyqtSlot()
+    def search(self):
+        """Shows tokens containing the text of the search line, all tokens if it is empty."""
+        text = self.line_search.text()
+        self._show(self.table_model.find(text) if text else None)
+
+
+""" F U N C T I O N S:  #############################################################################################"""
+
+
+def _multinomial_log_likelihoods(model, row, counts, totals):
+    """Returns log((w_c+1)/(v+l_c)) of counts in the class of the row of w_c."""
+    return numpy.log((counts + 1) / (model.v + model.l_c[row]))
+
+
+def _bernoulli_log_likelihoods(model, row, counts, totals):
+    """Returns log((w_c+1)/(d_c+2)) of numbers of rows with tokens in the class of the row of w_c."""
+    return numpy.log((counts + 1) / (model.d_c[row] + 2))
+
+
+def _complement_log_likelihoods(model, row, counts, totals):
+    """Returns -log((n+1)/(v+m)) of counts in the class of the row of w_c, n are occurrences of tokens
+    and m of all tokens in other classes."""
+    return -numpy.log((totals - counts + 1) / (model.v + model.l_c.sum() - model.l_c[row]))
+
+
+# Functions, which return log-likelihoods of tokens in a class shown by the model browser, by algorithm
+# of data.ALGORITHM_REGISTRY. The function of an algorithm is named _<algorithm>_log_likelihoods.
+_LOG_LIKELIHOODS = {algorithm: globals()['_%s_log_likelihoods' % algorithm] for algorithm in data.ALGORITHMS}
+
+
 """ E N D   O F   F I L E.  #########################################################################################"""